@@ -0,0 +1,173 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from starlette.responses import JSONResponse
+
+from config import CHECKIN_BURST, CHECKIN_RATE_PER_MINUTE
+from metrics import registry
+
+admitted_requests = registry.counter(
+    "admission_admitted_total", "Requests let through admission control by route class")
+rejected_requests = registry.counter(
+    "admission_rejected_total", "Requests turned away by admission control, by route class and reason")
+
+# Served without the database, so never limited
+EXEMPT_PATHS = ("/", "/metrics", "/docs", "/openapi.json")
+CHECK_IN_PATH = "/checkin/"
+# A check-in body is a small JSON object; larger ones are left to validation
+MAX_PEEK_BYTES = 4096
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """The concurrency class of a request, or None if it is not limited."""
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/export/"):
+        return "export"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+class TokenBucket:
+    """
+    Thread-safe token buckets, one per key, bounded by key count.
+
+    Each key holds up to `burst` tokens and regains `rate` tokens per second.
+    The least recently used key is dropped once `maxsize` keys are tracked;
+    it comes back with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int = 100000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Hashable, tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: Hashable) -> float:
+        """
+        Take a token for `key`.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available.
+        """
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that sheds load before it reaches the connection pool.
+
+    Requests are grouped by route_class() and each class may have at most
+    `limits[class]` requests in flight; beyond that they fail at once with a
+    503 and Retry-After rather than queueing for a connection. Admitted
+    check-ins then take a token from `check_in_bucket` keyed by user id, so a
+    client hammering POST /checkin/ gets a 429 without touching the database.
+    """
+
+    def __init__(self, app, limits: Dict[str, int],
+                 check_in_bucket: Optional[TokenBucket] = None, retry_after: int = 1):
+        self.app = app
+        self.limits = limits
+        self.check_in_bucket = check_in_bucket
+        self.retry_after = retry_after
+        # Only touched on the event loop, so plain counters are enough
+        self.in_flight = {route: 0 for route in limits}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_class(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(route)
+        if limit is not None and self.in_flight[route] >= limit:
+            rejected_requests.inc(route_class=route, reason="concurrency")
+            await _reject(503, "Server busy, retry shortly", self.retry_after,
+                          scope, receive, send)
+            return
+
+        # The slot is held while the body is read, so the limit stays exact.
+        # Only admitted check-ins spend a token; a 503 above costs nothing.
+        if limit is not None:
+            self.in_flight[route] += 1
+        try:
+            if (self.check_in_bucket is not None and scope["method"] == "POST"
+                    and scope["path"] == CHECK_IN_PATH):
+                user_id, receive = await _peek_user_id(receive)
+                if user_id is not None:
+                    wait = self.check_in_bucket.take(user_id)
+                    if wait:
+                        rejected_requests.inc(route_class=route, reason="rate_limit")
+                        await _reject(429, "Too many check-ins, slow down", math.ceil(wait),
+                                      scope, receive, send)
+                        return
+
+            admitted_requests.inc(route_class=route)
+            await self.app(scope, receive, send)
+        finally:
+            if limit is not None:
+                self.in_flight[route] -= 1
+
+
+async def _peek_user_id(receive):
+    """Read a check-in body for its user_id; returns a receive that replays it."""
+    messages = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body") or len(body) > MAX_PEEK_BYTES:
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    try:
+        user_id = json.loads(body)["user_id"]
+    except (ValueError, KeyError, TypeError):
+        return None, replay
+    return (user_id if isinstance(user_id, int) else None), replay
+
+
+async def _reject(status_code: int, detail: str, retry_after: int, scope, receive, send):
+    response = JSONResponse({"detail": detail}, status_code=status_code,
+                            headers={"Retry-After": str(retry_after)})
+    await response(scope, receive, send)
+
+
+# Check-in buckets of this process, shared by every request
+check_in_bucket = TokenBucket(rate=CHECKIN_RATE_PER_MINUTE / 60, burst=CHECKIN_BURST)
@@ -0,0 +1,92 @@
+"""
+Compare storage size and history query time before and after archiving check-ins into bitmaps.
+
+Seeds a scratch database, measures it, folds every check-in older than
+--keep-days into per-user bitmaps with the archive job, and measures again.
+
+Usage:
+    python -m benchmarks.bench_bitmaps --users 2000 --checkins 700000 --keep-days 30
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Dict
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.seed import seed_database
+from main import get_user_history
+from maintenance import archive_checkins
+
+TABLES = ("checkins", "checkin_bitmaps")
+
+
+def storage(db_path: str) -> Dict[str, int]:
+    """Bytes used by each check-in table with its indexes, and by the whole file."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("VACUUM")
+        sizes = dict(conn.execute(
+            "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s"
+            " JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name").fetchall())
+    finally:
+        conn.close()
+    report = {f"{name}_bytes": sizes.get(name, 0) for name in TABLES}
+    report["checkin_storage_bytes"] = sum(report.values())
+    report["file_bytes"] = os.path.getsize(db_path)
+    return report
+
+
+def history_timings(session_factory, users: int, reads: int) -> Dict[str, float]:
+    """Median and p95 of /users/{id}/history, called in-process, in ms."""
+    timings = []
+    with session_factory() as db:
+        for i in range(reads):
+            started = time.perf_counter()
+            get_user_history(i % users + 1, start=None, end=None, db=db)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {"history_median_ms": round(statistics.median(timings), 3),
+            "history_p95_ms": round(timings[int(len(timings) * 0.95)], 3)}
+
+
+def compare(db_path: str, users: int, checkins: int, keep_days: int,
+            reads: int = 500) -> Dict[str, dict]:
+    """Seed `db_path`, then measure it before and after archiving."""
+    seed_database(db_path, users, checkins)
+    Session = sessionmaker(bind=create_engine(f"sqlite:///{db_path}"))
+    report = {"before": {**storage(db_path), **history_timings(Session, users, reads)}}
+    result = archive_checkins(Session, date.today() - timedelta(days=keep_days), progress=None)
+    report["after"] = {**storage(db_path), **history_timings(Session, users, reads),
+                       "archived_checkins": result.checkins,
+                       "archive_seconds": round(result.seconds, 2)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--checkins", type=int, default=700000)
+    parser.add_argument("--keep-days", type=int, default=30)
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = compare(os.path.join(tmp, "bench.db"), args.users, args.checkins,
+                         args.keep_days, args.reads)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare throughput and tail latency of the sync and async database modes.
+
+Usage:
+    python -m benchmarks.bench_db_modes --users 2000 --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.harness import run_load, summarize
+from benchmarks.seed import seed_database
+from database_utils import get_async_db, get_db
+from main import async_router, sync_router
+
+
+def build_app(mode: str, db_path: str) -> FastAPI:
+    """Build an app serving `mode` routes against the scratch database."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    BenchSession = sessionmaker(autoflush=False, autocommit=False,
+                                bind=create_engine(f"sqlite:///{db_path}"))
+    AsyncBenchSession = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{db_path}"),
+        autoflush=False, expire_on_commit=False)
+
+    def override_get_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with AsyncBenchSession() as db:
+            yield db
+
+    bench_app = FastAPI()
+    if mode == "async":
+        bench_app.include_router(async_router)
+    bench_app.include_router(sync_router)
+    bench_app.dependency_overrides[get_db] = override_get_db
+    bench_app.dependency_overrides[get_async_db] = override_get_async_db
+    return bench_app
+
+
+def request_mix(users: int):
+    """60% user reads, 20% leaderboard reads and 20% check-ins."""
+    def make_request(i: int):
+        user_id = i % users + 1
+        slot = i % 10
+        if slot < 6:
+            return "GET", f"/users/{user_id}", None
+        if slot < 8:
+            return "GET", "/leaderboard/", None
+        return "POST", "/checkin/", {"user_id": user_id}
+    return make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            seed_database(db_path, args.users, checkins=0)
+            samples, elapsed = asyncio.run(run_load(
+                build_app(mode, db_path), request_mix(args.users),
+                args.requests, args.concurrency))
+            results[mode] = summarize([s[1] for s in samples], elapsed)
+            results[mode]["errors"] = sum(1 for s in samples if s[2] >= 500)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the validated and FAST_JSON serialization paths for large list responses.
+
+Usage:
+    python -m benchmarks.bench_serialization --users 5000 --requests 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from fastapi.middleware.gzip import GZipMiddleware
+
+import main as api
+from benchmarks.bench_db_modes import build_app
+from benchmarks.harness import run_load, summarize_by_route
+from benchmarks.seed import seed_database
+
+# (label, FAST_JSON, gzip)
+VARIANTS = (("validated", False, False), ("fast_json", True, False), ("fast_json_gzip", True, True))
+
+
+def list_requests(page_size: int):
+    """Alternate full user pages and full leaderboard pages."""
+    def make_request(i: int):
+        if i % 2:
+            return "GET", "/leaderboard/?limit=100", None
+        return "GET", f"/users/?limit={page_size}", None
+    return make_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=api.MAX_PAGE_SIZE)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed_database(db_path, args.users, checkins=args.users * 5)
+        for label, fast_json, gzip in VARIANTS:
+            bench_app = build_app("sync", db_path)
+            if gzip:
+                bench_app.add_middleware(GZipMiddleware, minimum_size=api.GZIP_MIN_SIZE)
+            api.FAST_JSON = fast_json
+            samples, elapsed = asyncio.run(run_load(
+                bench_app, list_requests(args.page_size), args.requests, args.concurrency))
+            results[label] = summarize_by_route(samples, elapsed)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Measure check-in throughput as users are spread over more SQLite shards.
+
+For each shard count K, seeds one scratch database, moves it into K shard
+files with the rebalance tool, then drives POST /checkin/ for distinct
+users through the sharded routes. SQLite takes one writer per file, so
+concurrent check-ins queue on a single database but commit side by side
+on different shards. The gain grows with the time a commit holds that
+lock: measure with --synchronous FULL on the production disk. When the
+handlers themselves saturate the CPU, K mostly shortens the tail latency
+spent waiting for the lock.
+
+Usage:
+    python -m benchmarks.bench_shards --users 5000 --shards 1 2 4 --concurrency 64 \
+        [--synchronous FULL]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from typing import Dict, Optional, Sequence
+
+from fastapi import FastAPI
+from sqlalchemy import event
+
+from benchmarks.harness import run_load, summarize
+from benchmarks.seed import seed_database
+from main import get_shard_set, sharded_router
+from shards import ShardSet, rebalance
+
+
+def build_app(shard_set: ShardSet) -> FastAPI:
+    """Build an app serving the sharded routes against `shard_set`."""
+    bench_app = FastAPI()
+    bench_app.include_router(sharded_router)
+    bench_app.dependency_overrides[get_shard_set] = lambda: shard_set
+    return bench_app
+
+
+def check_ins(i: int):
+    """Every request checks in a different user, so none is rejected as a repeat."""
+    return "POST", "/checkin/", {"user_id": i + 1}
+
+
+def measure(tmp: str, shards: int, users: int, concurrency: int,
+            synchronous: Optional[str] = None) -> Dict[str, float]:
+    """Check in each of `users` seeded users once against `shards` shard files."""
+    source = os.path.join(tmp, f"source-{shards}.db")
+    seed_database(source, users, checkins=0)
+    urls = [f"sqlite:///{os.path.join(tmp, f'k{shards}-{shard}.db')}" for shard in range(shards)]
+    rebalance([f"sqlite:///{source}"], urls)
+
+    shard_set = ShardSet(urls)
+    if synchronous is not None:
+        for shard_engine in shard_set.engines:
+            event.listen(shard_engine, "connect", lambda connection, _: connection.execute(
+                f"PRAGMA synchronous={synchronous}"))
+    try:
+        samples, elapsed = asyncio.run(run_load(
+            build_app(shard_set), check_ins, users, concurrency))
+    finally:
+        shard_set.close()
+    summary = summarize([s[1] for s in samples], elapsed)
+    summary["errors"] = sum(1 for s in samples if s[2] != 200)
+    return summary
+
+
+def compare(shard_counts: Sequence[int], users: int, concurrency: int,
+            synchronous: Optional[str] = None) -> Dict[str, dict]:
+    """Throughput per shard count, with the speedup over the first one."""
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in shard_counts:
+            report[str(shards)] = measure(tmp, shards, users, concurrency, synchronous)
+    baseline = report[str(shard_counts[0])]["requests_per_sec"]
+    for summary in report.values():
+        summary["speedup"] = round(summary["requests_per_sec"] / baseline, 2) if baseline else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=5000,
+                        help="Users to seed; each checks in once")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--synchronous", choices=("OFF", "NORMAL", "FULL"),
+                        help="SQLite synchronous pragma for the shards (default: engine profile)")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = compare(args.shards, args.users, args.concurrency, args.synchronous)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
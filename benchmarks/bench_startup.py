@@ -0,0 +1,84 @@
+"""
+Measure cold-start cost: import time of `main` and time to the first response.
+
+Each run is a fresh interpreter, like a serverless cold start, against a seeded
+scratch database.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 10 --users 10000 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.seed import seed_database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter and prints one JSON line of timings.
+PROBE = """
+import json, time
+from fastapi.testclient import TestClient
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    status = client.get("/users/1").status_code
+answered = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000,
+                  "first_response_ms": (answered - started) * 1000,
+                  "status": status}))
+"""
+
+
+def probe(db_path: str, startup_mode: str) -> Dict[str, float]:
+    """Start one interpreter and return its timings, plus total process time."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", STARTUP_MODE=startup_mode)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def summarize_runs(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """Median and worst case of each timing, in ms."""
+    summary = {"runs": len(runs), "errors": sum(1 for run in runs if run["status"] != 200)}
+    for key in ("import_ms", "first_response_ms", "process_ms"):
+        values = [run[key] for run in runs]
+        summary[f"{key[:-3]}_median_ms"] = round(statistics.median(values), 1)
+        summary[f"{key[:-3]}_max_ms"] = round(max(values), 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--modes", default="warm,lazy",
+                        help="Comma-separated STARTUP_MODE values to compare")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed_database(db_path, args.users, checkins=0)
+        for mode in args.modes.split(","):
+            report[mode] = summarize_runs([probe(db_path, mode) for _ in range(args.runs)])
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Compare two driver reports route by route.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+
+METRICS = ("requests_per_sec", "p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(baseline: dict, candidate: dict) -> list:
+    """Return (route, metric, baseline, candidate, change %) rows."""
+    rows = []
+    routes = {"overall": (baseline["overall"], candidate["overall"])}
+    for route in sorted(set(baseline["routes"]) & set(candidate["routes"])):
+        routes[route] = (baseline["routes"][route], candidate["routes"][route])
+    for route, (before, after) in routes.items():
+        for metric in METRICS:
+            change = ((after[metric] - before[metric]) / before[metric] * 100
+                      if before[metric] else 0.0)
+            rows.append((route, metric, before[metric], after[metric], round(change, 1)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{'route':<28} {'metric':<18} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for route, metric, before, after, change in compare(baseline, candidate):
+        print(f"{route:<28} {metric:<18} {before:>10} {after:>10} {change:>+7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Drive the API in-process with a request mix or a replay file and report latency.
+
+Usage:
+    python -m benchmarks.driver --users 10000 --checkins 200000 --requests 20000 \\
+        --concurrency 64 --mix checkin=20,user=40,users=10,leaderboard=30 --output run.json
+    python -m benchmarks.driver --db bench.db --replay requests.jsonl --output run.json
+
+A replay file holds one request per line: {"method": "GET", "path": "/users/1"},
+with an optional "json" body. Lines without a method and path are skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.harness import RequestSpec, run_load, summarize, summarize_by_route
+from benchmarks.seed import seed_database
+from database_utils import create_db_engine, get_async_db, get_db
+
+DEFAULT_MIX = "checkin=20,user=40,users=10,leaderboard=30"
+ROUTE_KINDS = ("checkin", "user", "users", "leaderboard")
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse "checkin=20,user=40" into weights per request kind."""
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in ROUTE_KINDS:
+            raise ValueError(f"Unknown request kind '{kind}', expected one of {ROUTE_KINDS}")
+        weights[kind.strip()] = int(weight)
+    return weights
+
+
+def mix_requests(mix: Dict[str, int], users: int, seed: int = 7):
+    """Build a make_request(i) drawing request kinds by weight."""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=100000)
+
+    def make_request(i: int) -> RequestSpec:
+        kind = kinds[i % len(kinds)]
+        user_id = i % users + 1
+        if kind == "checkin":
+            return "POST", "/checkin/", {"user_id": user_id}
+        if kind == "user":
+            return "GET", f"/users/{user_id}", None
+        if kind == "users":
+            return "GET", "/users/?limit=100", None
+        return "GET", "/leaderboard/", None
+    return make_request
+
+
+def load_replay(path: str) -> List[RequestSpec]:
+    """Read a JSONL replay file into request specs."""
+    specs = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "method" in record and "path" in record:
+                specs.append((record["method"], record["path"], record.get("json")))
+    return specs
+
+
+def use_database(app, db_path: str) -> None:
+    """Point the app's session dependencies at the benchmark database."""
+    db_engine = create_db_engine(f"sqlite:///{db_path}")
+    BenchSession = sessionmaker(autoflush=False, autocommit=False, bind=db_engine)
+
+    def override_get_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        from database_utils import create_async_db_engine
+        AsyncBenchSession = async_sessionmaker(
+            create_async_db_engine(f"sqlite:///{db_path}"),
+            autoflush=False, expire_on_commit=False)
+    except ImportError:
+        return
+
+    async def override_get_async_db():
+        async with AsyncBenchSession() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="Existing database to use instead of seeding one")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--checkins", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--replay", help="JSONL file of requests to replay instead of --mix")
+    parser.add_argument("--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    # Imported after argument parsing so DB_MODE etc. can be set by the caller
+    from main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        seeded = None
+        if db_path is None:
+            db_path = os.path.join(tmp, "bench.db")
+            seeded = seed_database(db_path, args.users, args.checkins)
+        use_database(app, db_path)
+
+        if args.replay:
+            specs = load_replay(args.replay)
+            if not specs:
+                parser.error(f"{args.replay} has no lines with a method and path")
+            total, make_request = len(specs), specs.__getitem__
+        else:
+            total, make_request = args.requests, mix_requests(parse_mix(args.mix), args.users)
+
+        samples, elapsed = asyncio.run(run_load(app, make_request, total, args.concurrency))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "db_mode": os.getenv("DB_MODE", "sync"),
+            "concurrency": args.concurrency,
+            "mix": None if args.replay else args.mix,
+            "replay": args.replay,
+            "seeded": seeded,
+        },
+        "overall": summarize([s[1] for s in samples], elapsed),
+        "routes": summarize_by_route(samples, elapsed),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Shared helpers for driving the ASGI app in-process and reporting latency."""
+import asyncio
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# A request is described as (method, url, json_body).
+RequestSpec = Tuple[str, str, Optional[dict]]
+
+# One measured request: (route label, latency in seconds, status code).
+Sample = Tuple[str, float, int]
+
+
+def route_label(method: str, url: str) -> str:
+    """Group URLs by route, e.g. "GET /users/{id}" for GET /users/42?x=1."""
+    path = url.split("?", 1)[0]
+    parts = ["{id}" if part.isdigit() else part for part in path.split("/")]
+    return f"{method.upper()} {'/'.join(parts)}"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1,
+                max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize latencies (seconds) into throughput and percentiles in ms."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "requests_per_sec": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def summarize_by_route(samples: List[Sample], elapsed: float) -> Dict[str, dict]:
+    """Summarize samples per route label, with a count per status code."""
+    by_route: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+
+    report = {}
+    for label, route_samples in sorted(by_route.items()):
+        summary = summarize([s[1] for s in route_samples], elapsed)
+        statuses: Dict[str, int] = defaultdict(int)
+        for s in route_samples:
+            statuses[str(s[2])] += 1
+        summary["status_codes"] = dict(sorted(statuses.items()))
+        report[label] = summary
+    return report
+
+
+async def run_load(app, make_request: Callable[[int], RequestSpec],
+                   total: int, concurrency: int) -> Tuple[List[Sample], float]:
+    """
+    Send `total` requests to `app` with at most `concurrency` in flight.
+
+    Returns:
+        tuple: (samples (list): (route_label, latency_seconds, status_code) per request,
+                elapsed (float): Wall-clock seconds for the whole run.
+            )
+    """
+    samples: List[Sample] = []
+    next_index = iter(range(total))
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for i in next_index:
+                method, url, body = make_request(i)
+                started = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                samples.append((route_label(method, url),
+                                time.perf_counter() - started, response.status_code))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return samples, elapsed
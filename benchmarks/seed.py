@@ -0,0 +1,87 @@
+"""
+Seed a scratch SQLite database with synthetic users and check-in history.
+
+Usage:
+    python -m benchmarks.seed --db bench.db --users 10000 --checkins 500000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from database_utils import Base, create_db_engine
+from maintenance import backfill_rollups, recompute_streaks
+from models import User, CheckIn
+
+INSERT_CHUNK_SIZE = 10000
+
+
+def _history(rng: random.Random, count: int, today: date):
+    """Yield `count` distinct check-in dates walking back from today, mostly consecutive."""
+    day = today - timedelta(days=rng.randint(0, 3))
+    for _ in range(count):
+        yield day
+        day -= timedelta(days=1 if rng.random() < 0.8 else rng.randint(2, 6))
+
+
+def seed_database(db_path: str, users: int, checkins: int, seed: int = 42,
+                  profile: str = "default") -> dict:
+    """
+    Create the schema in `db_path` and fill it with synthetic data.
+
+    Check-ins are spread evenly over users. Counters and XP rollups are then
+    derived with the maintenance jobs so both agree with the history.
+
+    Returns:
+        dict: Row counts and seconds taken.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    started = time.perf_counter()
+    db_engine = create_db_engine(f"sqlite:///{db_path}", profile=profile)
+    Base.metadata.create_all(bind=db_engine)
+    rng = random.Random(seed)
+    today = date.today()
+
+    with db_engine.begin() as conn:
+        for start in range(0, users, INSERT_CHUNK_SIZE):
+            conn.execute(insert(User), [
+                {"username": f"user{i}", "email": f"user{i}@example.com",
+                 "total_xp": 0, "current_streak": 0}
+                for i in range(start, min(start + INSERT_CHUNK_SIZE, users))])
+
+        per_user, extra = divmod(checkins, users) if users else (0, 0)
+        pending = []
+        for user_id in range(1, users + 1):
+            count = per_user + (1 if user_id <= extra else 0)
+            pending += [{"user_id": user_id, "checkin_date": day, "xp_earned": 10}
+                        for day in _history(rng, count, today)]
+            if len(pending) >= INSERT_CHUNK_SIZE:
+                conn.execute(insert(CheckIn), pending)
+                pending = []
+        if pending:
+            conn.execute(insert(CheckIn), pending)
+
+    recompute_streaks(sessionmaker(bind=db_engine), progress=None)
+    backfill_rollups(sessionmaker(bind=db_engine), progress=None)
+    db_engine.dispose()
+    return {"users": users, "checkins": checkins,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="bench.db", help="SQLite file to (re)create")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--checkins", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(seed_database(args.db, args.users, args.checkins, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
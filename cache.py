@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL, USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class LRUTTLCache:
+    """
+    Thread-safe cache bounded by entry count and entry age.
+
+    The least recently used entry is evicted once `maxsize` is reached and
+    entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store `value` for `key`, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key: Hashable, func: Callable[[Any], Any]) -> None:
+        """Replace a cached value with func(value), if one is cached."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data[key] = (item[0], func(item[1]))
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop the entry for `key`, if any."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss, eviction and expiration counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+# UserResponse records keyed on (database_key, user_id)
+user_cache = LRUTTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Serialized CheckInResponse bodies keyed on (database_key, user_id, Idempotency-Key)
+idempotency_cache = LRUTTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL)
@@ -0,0 +1,126 @@
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import CheckInBitmap
+from streaks import StreakSummary, calculate_milestone_bonus
+
+
+class DayBits(NamedTuple):
+    """Check-in days as an int: bit i is set for the day with ordinal epoch + i."""
+    epoch: int
+    bits: int
+
+
+def to_bytes(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def from_row(row: CheckInBitmap) -> DayBits:
+    return DayBits(row.epoch.toordinal(), int.from_bytes(row.days, "little"))
+
+
+def add_days(day_bits: Optional[DayBits], days: Iterable[int]) -> Optional[DayBits]:
+    """
+    Set the bits of `days` (date ordinals), moving the epoch back if needed.
+
+    Returns None if there were no days to start with and none were added.
+    """
+    days = list(days)
+    if not days:
+        return day_bits
+    low = min(days)
+    if day_bits is None:
+        epoch, bits = low, 0
+    elif low < day_bits.epoch:
+        epoch, bits = low, day_bits.bits << (day_bits.epoch - low)
+    else:
+        epoch, bits = day_bits
+    for day in days:
+        bits |= 1 << (day - epoch)
+    return DayBits(epoch, bits)
+
+
+def count_days(day_bits: DayBits, start: int, end: int) -> int:
+    """Days checked in between the ordinals `start` and `end`, inclusive."""
+    low = max(start - day_bits.epoch, 0)
+    high = end - day_bits.epoch
+    if high < low:
+        return 0
+    return ((day_bits.bits >> low) & ((1 << (high - low + 1)) - 1)).bit_count()
+
+
+def run_ending_at(bits: int, position: int) -> int:
+    """Length of the run of set bits ending at bit `position`, 0 if it is clear."""
+    if position < 0:
+        return 0
+    mask = (1 << (position + 1)) - 1
+    gaps = ~bits & mask
+    if not gaps:
+        return position + 1
+    return position - (gaps.bit_length() - 1)
+
+
+def longest_run(bits: int) -> int:
+    """Longest run of consecutive set bits; each pass shortens every run by one."""
+    longest = 0
+    while bits:
+        bits &= bits >> 1
+        longest += 1
+    return longest
+
+
+def summarize_bits(day_bits: Optional[DayBits], today: int) -> StreakSummary:
+    """summarize_days() for a bitmap, without walking the days one by one."""
+    if day_bits is None or not day_bits.bits:
+        return StreakSummary(0, 0, 0, 0, 0)
+    epoch, bits = day_bits
+    first = epoch + (bits & -bits).bit_length() - 1
+    last = epoch + bits.bit_length() - 1
+    current = run_ending_at(bits, last - epoch) if last >= today - 1 else 0
+    return StreakSummary(first, last, bits.bit_count(), longest_run(bits), current)
+
+
+def iter_days(day_bits: DayBits) -> Iterator[int]:
+    """Ordinals of the days set, in order."""
+    epoch, remaining = day_bits
+    while remaining:
+        lowest = remaining & -remaining
+        remaining ^= lowest
+        yield epoch + lowest.bit_length() - 1
+
+
+def replay(day_bits: DayBits, start: Optional[int] = None,
+           end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (day ordinal, XP) for each day set between `start` and `end`.
+
+    Per-day XP is not stored, so it is what recompute_streaks assigns: 10
+    plus the milestone bonus for the day's position in its run.
+    """
+    epoch, bits = day_bits
+    low = max((start if start is not None else epoch) - epoch, 0)
+    high = bits.bit_length() - 1 if end is None else min(end - epoch, bits.bit_length() - 1)
+    previous = low - 1
+    run = run_ending_at(bits, previous)
+    remaining = (bits >> low) & ((1 << max(high - low + 1, 0)) - 1)
+    while remaining:
+        lowest = remaining & -remaining
+        position = low + lowest.bit_length() - 1
+        remaining ^= lowest
+        run = run + 1 if position == previous + 1 else 1
+        previous = position
+        yield epoch + position, 10 + calculate_milestone_bonus(run)
+
+
+def load_bitmaps(db: Session, user_ids: List[int]) -> Dict[int, DayBits]:
+    """Archived check-in days of the given users that have any."""
+    return {row.user_id: from_row(row) for row in db.scalars(
+        select(CheckInBitmap).where(CheckInBitmap.user_id.in_(user_ids)))}
+
+
+def bitmap_row(user_id: int, day_bits: DayBits, archived_before: date) -> dict:
+    return {"user_id": user_id, "epoch": date.fromordinal(day_bits.epoch),
+            "days": to_bytes(day_bits.bits), "archived_before": archived_before}
@@ -0,0 +1,89 @@
+import os
+
+# Database access mode: "sync" serves requests through the blocking Session on
+# Starlette's threadpool, "async" through an AsyncSession on the event loop.
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# "warm" creates missing tables and loads the leaderboard index at startup.
+# "lazy" does neither, for serverless cold starts: the first request that
+# uses the database migrates it, and the index loads on its first read.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warm")
+
+# Database URL for production
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+
+# Engine tuning profile, one of database_utils.ENGINE_PROFILES.
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+
+# Sharded storage: with SHARDS=K > 0, users and their rows live in K
+# databases named by SHARD_URL_TEMPLATE, user `id` on shard `id % K`, and
+# DATABASE_URL is not used for them. Move data in or change K with
+# `python maintenance.py rebalance`.
+SHARDS = int(os.getenv("SHARDS", "0"))
+SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///./database-{shard}.db")
+
+# Read-through cache of user records in front of user lookups.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+# Responses to POST /checkin/ kept per Idempotency-Key so client retries are
+# answered from memory; a key is good for a day by default.
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+# Seconds a worker trusts its in-process leaderboard index before checking
+# the database for users or check-ins added by other workers, and reloading
+# if there are any; 0 never checks. Pages from different workers can still
+# differ by up to this long: with more than one worker (uvicorn --workers,
+# several instances) set LEADERBOARD_SNAPSHOT_PATH for one shared top list.
+LEADERBOARD_INDEX_TTL = float(os.getenv("LEADERBOARD_INDEX_TTL", "30"))
+
+# Seconds a shared cache (the CDN in front of the deployment) may serve a
+# leaderboard page before revalidating it with its ETag.
+LEADERBOARD_CACHE_SECONDS = int(os.getenv("LEADERBOARD_CACHE_SECONDS", "5"))
+
+# Serve user and leaderboard lists from selected columns encoded with orjson,
+# skipping ORM hydration and response-model validation.
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+
+# Responses at least this many bytes are gzip-compressed for clients that accept it.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
+# Memory-mapped file (e.g. under /dev/shm) holding the serialized top
+# LEADERBOARD_SNAPSHOT_SIZE entries, shared by all worker processes. After a
+# write the snapshot is marked dirty, and one worker rebuilds it within
+# LEADERBOARD_SNAPSHOT_INTERVAL_MS. Unset keeps a per-process leaderboard.
+LEADERBOARD_SNAPSHOT_PATH = os.getenv("LEADERBOARD_SNAPSHOT_PATH", "")
+LEADERBOARD_SNAPSHOT_SIZE = int(os.getenv("LEADERBOARD_SNAPSHOT_SIZE", "100"))
+LEADERBOARD_SNAPSHOT_INTERVAL_MS = float(os.getenv("LEADERBOARD_SNAPSHOT_INTERVAL_MS", "200"))
+
+# Write-behind check-ins: accepted against in-memory user state, then
+# group-committed by a background thread every WRITE_BEHIND_INTERVAL_MS or
+# WRITE_BEHIND_MAX_BATCH items. With WRITE_BEHIND_DURABLE=1 a check-in is only
+# acknowledged once its batch has committed; with 0 it is acknowledged at once
+# and can be lost if the process dies before the next flush.
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50"))
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+WRITE_BEHIND_DURABLE = os.getenv("WRITE_BEHIND_DURABLE", "1") == "1"
+
+# Admission control: at most ADMISSION_WRITE_LIMIT writes, ADMISSION_READ_LIMIT
+# reads and ADMISSION_EXPORT_LIMIT exports in flight; more fail at once with a
+# 503 and Retry-After. 0 derives the write and read limits from the connection
+# pool (one and four requests per connection). Each user also gets a bucket of
+# CHECKIN_BURST check-ins refilled at CHECKIN_RATE_PER_MINUTE; beyond it
+# POST /checkin/ answers 429. Off by default.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "0") == "1"
+ADMISSION_WRITE_LIMIT = int(os.getenv("ADMISSION_WRITE_LIMIT", "0"))
+ADMISSION_READ_LIMIT = int(os.getenv("ADMISSION_READ_LIMIT", "0"))
+ADMISSION_EXPORT_LIMIT = int(os.getenv("ADMISSION_EXPORT_LIMIT", "2"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+CHECKIN_BURST = int(os.getenv("CHECKIN_BURST", "5"))
+CHECKIN_RATE_PER_MINUTE = float(os.getenv("CHECKIN_RATE_PER_MINUTE", "6"))
+
+# Seconds between in-process sweeps resetting lapsed streaks; 0 disables them
+# (run `python maintenance.py sweep` from a scheduler instead).
+STREAK_SWEEP_INTERVAL = float(os.getenv("STREAK_SWEEP_INTERVAL", "0"))
+
+# Requests slower than this many milliseconds are logged with their SQL; 0 disables.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
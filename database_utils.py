@@ -1,10 +1,164 @@
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from config import DATABASE_URL, DB_PROFILE
+
+# PRAGMAs applied to every new SQLite connection. WAL lets readers run
+# alongside the single writer and busy_timeout makes writers wait for the
+# lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64000,
+}
+
+# Engine settings selected with DB_PROFILE. Pool settings apply to server
+# databases, pragmas to SQLite.
+ENGINE_PROFILES = {
+    "default": {
+        "pool": {"pool_size": 5, "max_overflow": 10, "pool_pre_ping": True},
+        "sqlite_pragmas": SQLITE_PRAGMAS,
+    },
+    "high_concurrency": {
+        "pool": {"pool_size": 20, "max_overflow": 20, "pool_timeout": 5,
+                 "pool_pre_ping": True, "pool_recycle": 1800},
+        "sqlite_pragmas": {**SQLITE_PRAGMAS, "busy_timeout": 15000,
+                           "cache_size": -256000},
+    },
+    # Short-lived serverless functions should not keep server connections open
+    "serverless": {
+        "pool": {"poolclass": NullPool},
+        "sqlite_pragmas": SQLITE_PRAGMAS,
+    },
+    # Library defaults, as before engine profiles existed
+    "legacy": {
+        "pool": {},
+        "sqlite_pragmas": {},
+    },
+}
+
+# Async drivers used for each sync dialect when DB_MODE=async.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def normalize_url(url: str) -> str:
+    """Accept the postgres:// scheme some hosting providers hand out."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url: str, profile: str = DB_PROFILE) -> dict:
+    """
+    Keyword arguments for create_engine for a URL under a profile.
+
+    Args:
+        url (str): The database URL.
+        profile (str): Name of an entry in ENGINE_PROFILES.
+
+    Returns:
+        dict: Pool arguments for server databases, empty for SQLite.
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(
+            f"Unknown DB_PROFILE '{profile}', expected one of {sorted(ENGINE_PROFILES)}")
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return dict(ENGINE_PROFILES[profile]["pool"])
+
+
+def pool_capacity(url: str = DATABASE_URL, profile: str = DB_PROFILE) -> Optional[int]:
+    """
+    Connections the engine for `url` under `profile` can hand out at once.
+
+    Returns:
+        int: pool_size plus max_overflow, with SQLAlchemy's defaults (5 and
+            10) for settings the profile leaves out; None without a pool limit.
+    """
+    options = engine_options(normalize_url(url), profile)
+    if options.get("poolclass") is NullPool:
+        return None
+    return options.get("pool_size", 5) + max(options.get("max_overflow", 10), 0)
+
+
+def apply_sqlite_pragmas(sync_engine: Engine, pragmas: dict) -> None:
+    """Run `pragmas` on every new DBAPI connection of a SQLite engine."""
+    if not pragmas or sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-engine = create_engine('sqlite:///database.db')
+
+def create_db_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE) -> Engine:
+    """Create the sync engine for `url` tuned by `profile`."""
+    url = normalize_url(url)
+    db_engine = create_engine(url, **engine_options(url, profile))
+    apply_sqlite_pragmas(db_engine, ENGINE_PROFILES[profile]["sqlite_pragmas"])
+    return db_engine
+
+
+def create_async_db_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE):
+    """Create the async engine for `url` tuned by `profile`."""
+    # Imported lazily so the async drivers stay optional in sync mode.
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = normalize_url(url)
+    async_engine = create_async_engine(
+        to_async_url(url), **engine_options(url, profile))
+    apply_sqlite_pragmas(async_engine.sync_engine,
+                         ENGINE_PROFILES[profile]["sqlite_pragmas"])
+    return async_engine
+
+
+engine = create_db_engine()
 Session = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 Base = declarative_base()
 
+_async_engine = None
+_AsyncSession = None
+
+
+def to_async_url(url: str) -> str:
+    """Rewrite a sync database URL to use the matching async driver."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{dialect}'")
+    return f"{ASYNC_DRIVERS[dialect]}{sep}{rest}"
+
+
+def database_key(db) -> str:
+    """Identify the database a session is bound to, ignoring the driver."""
+    url = db.get_bind().url
+    return url.set(drivername=url.get_backend_name()).render_as_string()
+
+
+def get_async_sessionmaker():
+    """Create the async engine and session factory on first use."""
+    global _async_engine, _AsyncSession
+    if _AsyncSession is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = create_async_db_engine()
+        _AsyncSession = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSession
+
 
 def get_db():
     """Getting the database session."""
@@ -13,3 +167,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Getting the async database session."""
+    async with get_async_sessionmaker()() as db:
+        yield db
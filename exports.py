@@ -0,0 +1,106 @@
+import csv
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from datetime import date
+from typing import BinaryIO, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from models import User, CheckIn
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Exported columns per table, in output order. `since_date` filters on the
+# date column: a user's last check-in, or the check-in day.
+EXPORT_TABLES = {
+    "users": ((User.id, User.username, User.email, User.total_xp,
+               User.current_streak, User.last_check_in_date), User.last_check_in_date),
+    "checkins": ((CheckIn.id, CheckIn.user_id, CheckIn.checkin_date, CheckIn.xp_earned),
+                 CheckIn.checkin_date),
+}
+
+
+def export_query(table: str, since_id: Optional[int] = None,
+                 since_date: Optional[date] = None) -> Select:
+    """
+    Select the rows of `table` to export, in id order.
+
+    Args:
+        table (str): "users" or "checkins".
+        since_id (int): Only rows with a greater id, e.g. the last id of the
+            previous export.
+        since_date (date): Only users who checked in, or check-ins made, on
+            or after this day.
+    """
+    columns, date_column = EXPORT_TABLES[table]
+    query = select(*columns).order_by(columns[0])
+    if since_id is not None:
+        query = query.where(columns[0] > since_id)
+    if since_date is not None:
+        query = query.where(date_column >= since_date)
+    return query
+
+
+def column_names(table: str) -> Sequence[str]:
+    return [column.key for column in EXPORT_TABLES[table][0]]
+
+
+def encode_rows(format: str, rows: Iterable[Sequence], names: Sequence[str]) -> bytes:
+    """Serialize a chunk of rows as CSV lines or NDJSON objects."""
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(
+            ["" if value is None else value for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    return "".join(json.dumps(dict(zip(names, row)), default=date.isoformat) + "\n"
+                   for row in rows).encode()
+
+
+def encode_header(format: str, names: Sequence[str]) -> bytes:
+    """The CSV header line; NDJSON has none."""
+    return (",".join(names) + "\n").encode() if format == "csv" else b""
+
+
+def export_chunks(db: Session, table: str, format: str = "csv", since_id: Optional[int] = None,
+                  since_date: Optional[date] = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield `table` serialized in chunks of `chunk_size` rows.
+
+    Rows come from a server-side cursor (yield_per), so memory stays bounded
+    by one chunk whatever the size of the table.
+    """
+    names = column_names(table)
+    header = encode_header(format, names)
+    if header:
+        yield header
+    result = db.execute(export_query(table, since_id, since_date)
+                        .execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        yield encode_rows(format, rows, names)
+
+
+@contextmanager
+def open_output(path: Optional[str], compress: bool = False) -> Iterator[BinaryIO]:
+    """Open `path`, or stdout if it is None or "-", for writing an export."""
+    if path in (None, "-"):
+        target, close = sys.stdout.buffer, False
+    else:
+        target, close = open(path, "wb"), True
+    try:
+        if compress:
+            with gzip.GzipFile(fileobj=target, mode="wb") as compressed:
+                yield compressed
+        else:
+            yield target
+    finally:
+        if close:
+            target.close()
+        else:
+            target.flush()
@@ -0,0 +1,233 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from config import LEADERBOARD_INDEX_TTL
+from database_utils import database_key
+from models import User
+from schemas import LeaderboardEntry
+from streaks import live_streak
+
+
+class LeaderboardIndex:
+    """
+    In-process order-statistic index over all users.
+
+    Users are kept in a sorted list keyed on (-total_xp, id), so a page of the
+    leaderboard is a slice and the rank of a user is a binary search, instead
+    of a full scan and sort of the users table per request.
+
+    Every change bumps a revision counter, exposed with a per-instance token
+    as `version` so readers can tell whether the ranking has moved. Streaks
+    are served as of the day they are read, 0 once lapsed, so the index
+    agrees with the sweep whichever process ran it.
+
+    Writes through other processes (more workers, or other instances) are
+    not seen by upsert(). Once `ttl` seconds have passed since the last
+    check, the next read compares the number of users and their total XP
+    with the index's own, and reloads if either differs: every new user
+    changes the count and every check-in adds XP.
+    """
+
+    def __init__(self, ttl: float = LEADERBOARD_INDEX_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[int, int]] = []
+        self._entries: Dict[int, Tuple[str, int, int, Optional[date]]] = {}
+        self._writes = 0
+        self._total_xp = 0
+        self._checked_at = 0.0
+        self._generation = uuid.uuid4().hex[:12]
+        self._revision = 0
+        self.loaded = False
+
+    @property
+    def version(self) -> str:
+        """Opaque token that changes whenever the served data changes."""
+        # Lapsed streaks read as 0 from the next day on, without a write
+        return f"{self._generation}-{self._revision}-{date.today().toordinal()}"
+
+    def load(self, db: Session, attempts: int = 3) -> None:
+        """Rebuild the index from the users table."""
+        # The lock is not held across the query: under AsyncSession.run_sync
+        # other requests run on the same thread while it waits. A write that
+        # lands mid-read may be missing from the snapshot, so read again.
+        for attempt in range(attempts):
+            with self._lock:
+                writes_before = self._writes
+            rows = db.execute(select(
+                User.id, User.username, User.total_xp, User.current_streak,
+                User.last_check_in_date)).all()
+            with self._lock:
+                if self._writes == writes_before or attempt == attempts - 1:
+                    self._entries = {
+                        row.id: (row.username, row.total_xp or 0, row.current_streak or 0,
+                                 row.last_check_in_date)
+                        for row in rows}
+                    self._keys = sorted((-entry[1], user_id)
+                                        for user_id, entry in self._entries.items())
+                    self._total_xp = sum(entry[1] for entry in self._entries.values())
+                    self._revision += 1
+                    self._checked_at = self._clock()
+                    self.loaded = True
+                    return
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Load the index on first use, and reload it once other processes wrote."""
+        if not self.loaded:
+            self.load(db)
+        elif self.ttl > 0 and self._clock() - self._checked_at >= self.ttl:
+            self._checked_at = self._clock()
+            with self._lock:
+                expected = (len(self._entries), self._total_xp)
+            if _write_mark(db) != expected:
+                self.load(db)
+
+    def reset(self) -> None:
+        """Drop all entries; the next ensure_loaded() reloads from the database."""
+        with self._lock:
+            self._entries = {}
+            self._keys = []
+            self._total_xp = 0
+            self._revision += 1
+            self.loaded = False
+
+    def upsert(self, user_id: int, username: str, total_xp: int, current_streak: int,
+               last_check_in_date: Optional[date] = None) -> None:
+        """Insert or move a user after a write. No-op until the index is loaded."""
+        with self._lock:
+            self._writes += 1
+            if not self.loaded:
+                return
+            previous = self._entries.get(user_id)
+            if previous is not None:
+                del self._keys[bisect_left(self._keys, (-previous[1], user_id))]
+                self._total_xp -= previous[1]
+            self._total_xp += total_xp
+            self._entries[user_id] = (username, total_xp, current_streak, last_check_in_date)
+            insort(self._keys, (-total_xp, user_id))
+            self._revision += 1
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _row(self, position: int, today: date) -> Dict[str, object]:
+        user_id = self._keys[position][1]
+        username, total_xp, current_streak, last_check_in_date = self._entries[user_id]
+        return {"rank": position + 1, "user_id": user_id, "username": username,
+                "total_xp": total_xp,
+                "current_streak": live_streak(current_streak, last_check_in_date, today)}
+
+    def _entry(self, position: int, today: date) -> LeaderboardEntry:
+        return LeaderboardEntry(**self._row(position, today))
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[LeaderboardEntry]:
+        """Return ranked entries for positions [offset, offset + limit)."""
+        return [LeaderboardEntry(**row) for row in self.page_rows(offset, limit)]
+
+    def page_rows(self, offset: int = 0, limit: int = 10) -> List[Dict[str, object]]:
+        """Like page(), as plain dicts ready to encode."""
+        today = date.today()
+        with self._lock:
+            end = min(offset + limit, len(self._keys))
+            return [self._row(position, today) for position in range(offset, end)]
+
+    def rank_of(self, user_id: int) -> Optional[int]:
+        """Return the 1-based rank of a user, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect_left(self._keys, (-entry[1], user_id)) + 1
+
+    def slice_around(self, key: Tuple[int, int], before: int,
+                     after: int) -> Tuple[int, List[Dict[str, object]], List[Dict[str, object]]]:
+        """
+        Where a (-total_xp, user_id) key falls in this index, with the rows around it.
+
+        Used to rank a user across several indexes, e.g. one per shard.
+
+        Returns:
+            tuple: (entries ranked above the key (int),
+                    up to `before` rows directly above it,
+                    up to `after` rows directly below it,
+                ) with ranks local to this index.
+        """
+        today = date.today()
+        with self._lock:
+            position = bisect_left(self._keys, key)
+            below = bisect_right(self._keys, key)
+            return (
+                position,
+                [self._row(p, today) for p in range(max(0, position - before), position)],
+                [self._row(p, today) for p in range(below, min(len(self._keys), below + after))],
+            )
+
+    def around(self, user_id: int, neighbours: int) -> Optional[
+            Tuple[LeaderboardEntry, List[LeaderboardEntry], List[LeaderboardEntry]]]:
+        """
+        Return a user's entry with up to `neighbours` entries on each side.
+
+        Returns:
+            tuple: (entry (LeaderboardEntry): The user's own entry,
+                    above (list): Entries ranked directly above the user,
+                    below (list): Entries ranked directly below the user.
+                ) or None if the user is unknown.
+        """
+        today = date.today()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            position = bisect_left(self._keys, (-entry[1], user_id))
+            start = max(0, position - neighbours)
+            end = min(len(self._keys), position + neighbours + 1)
+            return (
+                self._entry(position, today),
+                [self._entry(p, today) for p in range(start, position)],
+                [self._entry(p, today) for p in range(position + 1, end)],
+            )
+
+
+def _write_mark(db: Session) -> tuple:
+    """Number of users and their total XP, read from the total_xp index alone."""
+    return tuple(db.execute(select(
+        func.count(User.id), func.coalesce(func.sum(User.total_xp), 0))).one())
+
+
+_indexes: Dict[str, LeaderboardIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_leaderboard_index(db: Session, load: bool = True) -> LeaderboardIndex:
+    """
+    Return the index for the database `db` is bound to.
+
+    Args:
+        db (Session): Session bound to the database to index.
+        load (bool): Load the index if needed. Writers pass False, since
+            updates to an unloaded index are picked up by its first load.
+
+    Returns:
+        LeaderboardIndex: The index for that database.
+    """
+    with _indexes_lock:
+        index = _indexes.setdefault(database_key(db), LeaderboardIndex())
+    if load:
+        index.ensure_loaded(db)
+    return index
+
+
+def reset_leaderboard_indexes() -> None:
+    """Forget every loaded index, e.g. after rows were changed outside the API."""
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.reset()
@@ -0,0 +1,230 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import LEADERBOARD_SNAPSHOT_PATH, LEADERBOARD_SNAPSHOT_SIZE
+from models import User
+from schemas import LeaderboardEntry
+from streaks import live_streak
+
+logger = logging.getLogger("daily_streak.leaderboard_snapshot")
+
+MAGIC = b"LBS1"
+# Header fields, each written with a single store so a reader never sees a
+# mix of old and new values. The active slot is the parity of the version.
+U64 = struct.Struct("<Q")
+GENERATION, VERSION, DIRTY_SEQ, BUILT_SEQ = 8, 16, 24, 32
+HEADER_BYTES = 64
+# seq (odd while the slot is being written), entry count
+SLOT_HEADER = struct.Struct("<QI")
+# Room per entry; usernames are at most 50 characters
+ENTRY_BYTES = 512
+READ_ATTEMPTS = 5
+
+
+class LeaderboardSnapshot:
+    """
+    Serialized top-N leaderboard shared by every worker through a memory-mapped file.
+
+    The file holds two slots. A rebuild writes the slot readers are not
+    using, then makes it the active one and bumps the version, so readers
+    never see a half-written page. Each slot keeps the byte offset of every
+    entry, so any page inside the top N is a slice of the serialized JSON.
+
+    Workers call mark_dirty() after a write. refresh() rebuilds the snapshot
+    from the database if it is dirty; a lock file makes sure only one worker
+    does so per change.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self._offsets = struct.Struct(f"<{max_entries + 1}I")
+        self._data_start = SLOT_HEADER.size + self._offsets.size
+        self._slot_bytes = self._data_start + max_entries * ENTRY_BYTES
+        size = HEADER_BYTES + 2 * self._slot_bytes
+
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._locked():
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+                if self._map[:len(MAGIC)] != MAGIC:
+                    # A random generation keeps versions unique across file rebuilds
+                    self._set(GENERATION, uuid.uuid4().int & (2 ** 64 - 1))
+                    self._set(DIRTY_SEQ, 1)
+                    self._map[:len(MAGIC)] = MAGIC
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._lock_fd)
+
+    def _get(self, field: int) -> int:
+        return U64.unpack_from(self._map, field)[0]
+
+    def _set(self, field: int, value: int) -> None:
+        U64.pack_into(self._map, field, value)
+
+    @contextmanager
+    def _locked(self, blocking: bool = True):
+        """Hold the lock file; yields False if `blocking` is off and it is taken."""
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @property
+    def version(self) -> str:
+        """Opaque token shared by all workers; changes with every rebuild."""
+        return f"{self._get(GENERATION):x}-{self._get(VERSION)}"
+
+    def mark_dirty(self) -> None:
+        """Record that the leaderboard changed, so the next refresh() rebuilds it."""
+        # Increments racing in other processes may be lost, but the counter
+        # still moves past the last built value, which is all refresh() needs
+        self._set(DIRTY_SEQ, self._get(DIRTY_SEQ) + 1)
+
+    def is_dirty(self) -> bool:
+        return self._get(DIRTY_SEQ) != self._get(BUILT_SEQ)
+
+    def refresh(self, load: Callable[[int], List[LeaderboardEntry]]) -> bool:
+        """
+        Rebuild the snapshot if it is dirty and no other worker is rebuilding it.
+
+        Args:
+            load (callable): Returns the top `n` entries for `load(n)`.
+
+        Returns:
+            bool: True if this call published a new snapshot.
+        """
+        if not self.is_dirty():
+            return False
+        with self._locked(blocking=False) as acquired:
+            # Another worker may be rebuilding it, or just have done so
+            if not acquired or not self.is_dirty():
+                return False
+            # Changes marked after this read trigger another rebuild
+            dirty_seq = self._get(DIRTY_SEQ)
+            self._publish(load(self.max_entries), dirty_seq)
+            return True
+
+    def _publish(self, entries: List[LeaderboardEntry], built_seq: int) -> None:
+        version = self._get(VERSION)
+        # Write the slot that is not active: the one of the next version
+        base = HEADER_BYTES + ((version + 1) % 2) * self._slot_bytes
+
+        offsets = [0]
+        chunks = []
+        capacity = self._slot_bytes - self._data_start
+        for entry in entries:
+            chunk = entry.model_dump_json().encode() + b","
+            if offsets[-1] + len(chunk) > capacity:
+                break
+            chunks.append(chunk)
+            offsets.append(offsets[-1] + len(chunk))
+        count = len(chunks)
+        offsets += [offsets[-1]] * (self.max_entries + 1 - len(offsets))
+
+        seq = SLOT_HEADER.unpack_from(self._map, base)[0]
+        SLOT_HEADER.pack_into(self._map, base, seq + 1, count)
+        self._offsets.pack_into(self._map, base + SLOT_HEADER.size, *offsets)
+        data = b"".join(chunks)
+        self._map[base + self._data_start:base + self._data_start + len(data)] = data
+        SLOT_HEADER.pack_into(self._map, base, seq + 2, count)
+
+        self._set(BUILT_SEQ, built_seq)
+        self._set(VERSION, version + 1)
+
+    def read(self, offset: int, limit: int) -> Optional[Tuple[str, bytes]]:
+        """
+        Return (version, JSON array body) for ranks [offset, offset + limit).
+
+        Returns None if the snapshot has not been built yet or does not reach
+        that far down the leaderboard.
+        """
+        for _ in range(READ_ATTEMPTS):
+            version = self._get(VERSION)
+            if version == 0:
+                return None
+            base = HEADER_BYTES + (version % 2) * self._slot_bytes
+            seq, count = SLOT_HEADER.unpack_from(self._map, base)
+            if seq % 2:
+                continue
+            end = offset + limit
+            if end > count and count < self.max_entries:
+                # The whole table fits in the snapshot; clamp like the index does
+                end = count
+            if end > count:
+                return None
+            start = min(offset, end)
+            positions = self._offsets.unpack_from(self._map, base + SLOT_HEADER.size)
+            data_start = base + self._data_start
+            body = self._map[data_start + positions[start]:data_start + positions[end]]
+            if SLOT_HEADER.unpack_from(self._map, base)[0] == seq:
+                return f"{self._get(GENERATION):x}-{version}", b"[" + body[:-1] + b"]"
+        return None
+
+
+def load_top_entries(db: Session, n: int) -> List[LeaderboardEntry]:
+    """The top `n` users in leaderboard order, straight from the database."""
+    today = date.today()
+    rows = db.execute(
+        select(User.id, User.username, User.total_xp, User.current_streak,
+               User.last_check_in_date)
+        .order_by(User.total_xp.desc(), User.id)
+        .limit(n)).all()
+    return [LeaderboardEntry(rank=position + 1, user_id=row.id, username=row.username,
+                             total_xp=row.total_xp or 0,
+                             current_streak=live_streak(row.current_streak or 0,
+                                                        row.last_check_in_date, today))
+            for position, row in enumerate(rows)]
+
+
+def refresh_from(snapshot: LeaderboardSnapshot, session_factory: Callable[[], Session]) -> bool:
+    """Rebuild `snapshot` from the database behind `session_factory` if it is dirty."""
+    def load(n: int) -> List[LeaderboardEntry]:
+        started = time.perf_counter()
+        with session_factory() as db:
+            entries = load_top_entries(db, n)
+        logger.debug("rebuilt leaderboard snapshot in %.3fs", time.perf_counter() - started)
+        return entries
+
+    return snapshot.refresh(load)
+
+
+_snapshot: Optional[LeaderboardSnapshot] = None
+
+
+def get_snapshot() -> Optional[LeaderboardSnapshot]:
+    """The shared snapshot, or None unless LEADERBOARD_SNAPSHOT_PATH is set."""
+    global _snapshot
+    if _snapshot is None and LEADERBOARD_SNAPSHOT_PATH:
+        _snapshot = LeaderboardSnapshot(LEADERBOARD_SNAPSHOT_PATH, LEADERBOARD_SNAPSHOT_SIZE)
+    return _snapshot
+
+
+def notify_change() -> None:
+    """Mark the shared snapshot dirty after a write that can move the leaderboard."""
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        snapshot.mark_dirty()
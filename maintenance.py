@@ -0,0 +1,501 @@
+"""
+Offline maintenance jobs for the Daily Streak API.
+
+Usage:
+    python maintenance.py migrate
+    python maintenance.py recompute [--chunk-size N]
+    python maintenance.py backfill-rollups [--chunk-size N]
+    python maintenance.py archive --keep-days N [--chunk-size N]
+    python maintenance.py export users|checkins [--format csv|ndjson] [--since-id N]
+                                [--since-date YYYY-MM-DD] [--output PATH] [--gzip]
+    python maintenance.py rebalance --to-shards K [--to TEMPLATE] [--from URL ...]
+    python maintenance.py sweep
+"""
+import argparse
+import heapq
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from itertools import chain, groupby
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from checkin_bitmaps import DayBits, add_days, bitmap_row, iter_days, load_bitmaps, replay
+from database_utils import Base
+from models import User, CheckIn, CheckInBitmap, XpRollup
+from rollups import rollup_rows
+from streaks import calculate_milestone_bonus
+
+logger = logging.getLogger("maintenance")
+
+# Called with (users_done, users_total) after every chunk
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class RecomputeResult:
+    users: int = 0
+    checkins: int = 0
+    users_updated: int = 0
+    checkins_updated: int = 0
+    rollups: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class ArchiveResult:
+    users: int = 0
+    checkins: int = 0
+    seconds: float = 0.0
+    # Users left unarchived because stored XP differs from the derived XP
+    skipped_users: List[int] = field(default_factory=list)
+
+
+@dataclass
+class SweepResult:
+    rows: int = 0
+    seconds: float = 0.0
+    finished_at: float = 0.0
+    user_ids: List[int] = field(default_factory=list, repr=False)
+
+
+# Most recent sweep run in this process, for monitoring
+last_sweep: Optional[SweepResult] = None
+
+# Databases ensure_migrated() has migrated in this process
+_migrated: Set[str] = set()
+_migrate_lock = threading.Lock()
+
+
+def _log_progress(done: int, total: int) -> None:
+    logger.info("recomputed %d/%d users", done, total)
+
+
+def migrate(bind: Engine) -> None:
+    """
+    Create any missing tables and indexes, upgrading older databases in place.
+
+    create_all() only creates whole tables, so indexes and the one check-in
+    per user per day constraint added to existing tables are created here.
+    Duplicate check-ins that would violate the constraint are deleted first,
+    keeping the earliest; run recompute afterwards to correct the counters.
+    Rollups are backfilled when their table is created next to existing
+    check-ins.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        unique_keys = ([constraint["column_names"]
+                        for constraint in inspector.get_unique_constraints("checkins")]
+                       + [index["column_names"] for index in inspector.get_indexes("checkins")
+                          if index["unique"]])
+        if ["user_id", "checkin_date"] not in unique_keys:
+            kept = (select(func.min(CheckIn.id))
+                    .group_by(CheckIn.user_id, CheckIn.checkin_date).scalar_subquery())
+            removed = conn.execute(delete(CheckIn).where(CheckIn.id.not_in(kept))).rowcount
+            if removed:
+                logger.warning("deleted %d duplicate check-ins; run `recompute` to fix "
+                               "the counters", removed)
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_checkins_user_date "
+                              "ON checkins (user_id, checkin_date)"))
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    if "checkins" in existing_tables and XpRollup.__tablename__ not in existing_tables:
+        backfill_rollups(sessionmaker(bind=bind), progress=None)
+
+
+def is_migrated(bind: Engine) -> bool:
+    return bind.url.render_as_string() in _migrated
+
+
+def ensure_migrated(bind: Engine) -> None:
+    """Run migrate() on `bind` once per process, e.g. on first use after a lazy startup."""
+    key = bind.url.render_as_string()
+    if key in _migrated:
+        return
+    with _migrate_lock:
+        if key not in _migrated:
+            migrate(bind)
+            _migrated.add(key)
+
+
+def recompute_user_chunk(db: Session, user_ids: List[int], result: RecomputeResult,
+                         today: Optional[date] = None) -> None:
+    """
+    Rebuild streak, XP and per-check-in bonuses for a chunk of users.
+
+    Check-ins, archived days included, are replayed in date order: a day one
+    after the previous check-in extends the run, anything else restarts it at
+    1, and each check-in earns 10 XP plus the milestone bonus for its position
+    in the run. As in summarize_days(), the current streak is that last run
+    only if it ended today or yesterday, else 0. The chunk's weekly and
+    monthly rollups are rebuilt from the replayed XP in the same transaction.
+    """
+    yesterday = (today or date.today()) - timedelta(days=1)
+    current: Dict[int, dict] = {
+        row.id: {"current_streak": row.current_streak, "total_xp": row.total_xp,
+                 "last_check_in_date": row.last_check_in_date}
+        for row in db.execute(select(
+            User.id, User.current_streak, User.total_xp, User.last_check_in_date)
+            .where(User.id.in_(user_ids)))
+    }
+    rebuilt = {user_id: {"current_streak": 0, "total_xp": 0, "last_check_in_date": None}
+               for user_id in current}
+    checkin_updates = []
+    checkin_xp = []
+
+    def replay_user(user_id: int, day_bits: Optional[DayBits], user_rows) -> None:
+        # Archived days come first; they have no row whose XP could be rewritten
+        archived = ((day, None, None) for day in iter_days(day_bits)) if day_bits else ()
+        live = ((checkin_date.toordinal(), checkin_id, stored_xp)
+                for checkin_id, _, checkin_date, stored_xp in user_rows)
+        state = rebuilt.setdefault(
+            user_id, {"current_streak": 0, "total_xp": 0, "last_check_in_date": None})
+        previous_day = None
+        run = 0
+        for day, checkin_id, stored_xp in heapq.merge(archived, live, key=lambda item: item[0]):
+            if day == previous_day:
+                continue
+            run = run + 1 if previous_day is not None and day == previous_day + 1 else 1
+            previous_day = day
+
+            xp_earned = 10 + calculate_milestone_bonus(run)
+            if checkin_id is not None and xp_earned != stored_xp:
+                checkin_updates.append({"id": checkin_id, "xp_earned": xp_earned})
+            checkin_xp.append((user_id, date.fromordinal(day), xp_earned))
+            state["current_streak"] = run
+            state["total_xp"] += xp_earned
+            state["last_check_in_date"] = date.fromordinal(day)
+            result.checkins += 1
+        if state["last_check_in_date"] is not None and state["last_check_in_date"] < yesterday:
+            # Lapsed: the sweep would have reset it
+            state["current_streak"] = 0
+
+    bitmaps = load_bitmaps(db, user_ids)
+    rows = db.execute(
+        select(CheckIn.id, CheckIn.user_id, CheckIn.checkin_date, CheckIn.xp_earned)
+        .where(CheckIn.user_id.in_(user_ids))
+        .order_by(CheckIn.user_id, CheckIn.checkin_date)
+        .execution_options(yield_per=5000))
+    for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        replay_user(user_id, bitmaps.pop(user_id, None), user_rows)
+    # Users whose check-ins have all been archived
+    for user_id, day_bits in bitmaps.items():
+        replay_user(user_id, day_bits, ())
+
+    # Only users that exist, and whose counters actually changed, are written
+    user_updates = [{"id": user_id, **state} for user_id, state in rebuilt.items()
+                    if user_id in current and state != current[user_id]]
+    if user_updates:
+        db.execute(update(User), user_updates)
+    if checkin_updates:
+        db.execute(update(CheckIn), checkin_updates)
+    rollups = rollup_rows(checkin_xp)
+    db.execute(delete(XpRollup).where(XpRollup.user_id.in_(user_ids)))
+    if rollups:
+        db.execute(insert(XpRollup), rollups)
+    db.commit()
+
+    result.users += len(current)
+    result.users_updated += len(user_updates)
+    result.checkins_updated += len(checkin_updates)
+    result.rollups += len(rollups)
+
+
+def recompute_streaks(session_factory: sessionmaker, chunk_size: int = 1000,
+                      progress: Optional[ProgressCallback] = _log_progress,
+                      today: Optional[date] = None) -> RecomputeResult:
+    """
+    Rebuild every user's denormalized counters from the checkins table.
+
+    Users are processed in id order, chunk_size at a time, each chunk in its
+    own transaction, so memory stays bounded by the chunk and the job can be
+    interrupted and rerun. A running API reloads its leaderboard index
+    within LEADERBOARD_INDEX_TTL if XP changed; its user cache keeps old
+    records until they expire.
+
+    Args:
+        session_factory (sessionmaker): Creates sessions on the target database.
+        chunk_size (int): Number of users per chunk.
+        progress (callable): Called with (users_done, users_total) after each chunk.
+        today (date): Day current streaks are judged against (default: today).
+
+    Returns:
+        RecomputeResult: Rows read and rows rewritten.
+    """
+    result = RecomputeResult()
+    started = time.perf_counter()
+    with session_factory() as db:
+        total = db.scalar(select(func.count(User.id)))
+        last_id = 0
+        while True:
+            user_ids = db.scalars(
+                select(User.id).where(User.id > last_id)
+                .order_by(User.id).limit(chunk_size)).all()
+            if not user_ids:
+                break
+            recompute_user_chunk(db, user_ids, result, today)
+            last_id = user_ids[-1]
+            if progress is not None:
+                progress(result.users, total)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def backfill_rollups(session_factory: sessionmaker, chunk_size: int = 1000,
+                     progress: Optional[ProgressCallback] = _log_progress) -> int:
+    """
+    Rebuild the weekly and monthly XP rollups from the checkins table and
+    the archived check-in bitmaps.
+
+    Works through users chunk_size at a time like recompute_streaks(), each
+    chunk replacing its users' rollups in one transaction, so it can be rerun
+    at any time, e.g. after check-ins were changed outside the API. recompute
+    rebuilds the rollups of the users it replays itself.
+
+    Returns:
+        int: Rollup rows written.
+    """
+    written = 0
+    with session_factory() as db:
+        total = db.scalar(select(func.count(User.id)))
+        done = last_id = 0
+        while True:
+            user_ids = db.scalars(
+                select(User.id).where(User.id > last_id)
+                .order_by(User.id).limit(chunk_size)).all()
+            if not user_ids:
+                break
+            archived = ((user_id, date.fromordinal(day), xp_earned)
+                        for user_id, day_bits in load_bitmaps(db, user_ids).items()
+                        for day, xp_earned in replay(day_bits))
+            rows = rollup_rows(chain(db.execute(
+                select(CheckIn.user_id, CheckIn.checkin_date, CheckIn.xp_earned)
+                .where(CheckIn.user_id.in_(user_ids))
+                .execution_options(yield_per=5000)), archived))
+            db.execute(delete(XpRollup).where(XpRollup.user_id.in_(user_ids)))
+            if rows:
+                db.execute(insert(XpRollup), rows)
+            db.commit()
+            written += len(rows)
+            done += len(user_ids)
+            last_id = user_ids[-1]
+            if progress is not None:
+                progress(done, total)
+    return written
+
+
+def archive_checkins(session_factory: sessionmaker, before: date, chunk_size: int = 1000,
+                     progress: Optional[ProgressCallback] = _log_progress) -> ArchiveResult:
+    """
+    Fold check-ins older than `before` into per-user day bitmaps.
+
+    Each chunk of users has its old rows merged into their bitmaps and then
+    deleted in one transaction, so the job can be interrupted and rerun.
+    Only the days are kept: history and recompute_streaks() derive the XP of
+    an archived day from its position in its run, and users' counters are
+    left as they are. Users with a check-in whose stored XP differs from that
+    derived XP are skipped, since archiving would change their history and
+    rollups; run recompute first to archive them too.
+
+    Args:
+        session_factory (sessionmaker): Creates sessions on the target database.
+        before (date): Check-ins on earlier days are archived. Must not be
+            later than today, so today's check-ins stay in the checkins table.
+        chunk_size (int): Number of users per chunk.
+        progress (callable): Called with (users_done, users_total) after each chunk.
+
+    Returns:
+        ArchiveResult: Users with a bitmap written and rows folded into them.
+    """
+    if before > date.today():
+        raise ValueError("Cannot archive today's check-ins")
+    result = ArchiveResult()
+    started = time.perf_counter()
+    with session_factory() as db:
+        total = db.scalar(select(func.count(User.id)))
+        done = last_id = 0
+        while True:
+            user_ids = db.scalars(
+                select(User.id).where(User.id > last_id)
+                .order_by(User.id).limit(chunk_size)).all()
+            if not user_ids:
+                break
+            old_days: Dict[int, Dict[int, int]] = {}
+            for user_id, checkin_date, xp_earned in db.execute(
+                    select(CheckIn.user_id, CheckIn.checkin_date, CheckIn.xp_earned)
+                    .where(CheckIn.user_id.in_(user_ids), CheckIn.checkin_date < before)):
+                old_days.setdefault(user_id, {})[checkin_date.toordinal()] = xp_earned
+
+            bitmaps = load_bitmaps(db, list(old_days))
+            updates, inserts = [], []
+            for user_id, stored_xp in list(old_days.items()):
+                day_bits = add_days(bitmaps.get(user_id), stored_xp)
+                if any(stored_xp.get(day, xp_earned) != xp_earned
+                       for day, xp_earned in replay(day_bits, min(stored_xp))):
+                    result.skipped_users.append(user_id)
+                    del old_days[user_id]
+                    continue
+                row = bitmap_row(user_id, day_bits, before)
+                (updates if user_id in bitmaps else inserts).append(row)
+                result.checkins += len(stored_xp)
+
+            if old_days:
+                if updates:
+                    db.execute(update(CheckInBitmap), updates)
+                if inserts:
+                    db.execute(insert(CheckInBitmap), inserts)
+                db.execute(delete(CheckIn).where(
+                    CheckIn.user_id.in_(list(old_days)), CheckIn.checkin_date < before))
+                db.commit()
+                result.users += len(old_days)
+
+            done += len(user_ids)
+            last_id = user_ids[-1]
+            if progress is not None:
+                progress(done, total)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def sweep_expired_streaks(db: Session, today: Optional[date] = None) -> SweepResult:
+    """
+    Reset the streak of every user who missed a day, in one UPDATE.
+
+    check_in only resets a streak when the user comes back, so without this
+    a lapsed user keeps their old streak in the database. The API's
+    in-memory copies already serve it as 0 (see live_streak), so the sweep
+    needs no signal to running workers. The WHERE clause is served by the
+    index on last_check_in_date.
+
+    Args:
+        db (Session): The database session.
+        today (date): The current date (default: today).
+
+    Returns:
+        SweepResult: Rows touched, with their user ids, and the time taken.
+    """
+    global last_sweep
+    yesterday = (today or date.today()) - timedelta(days=1)
+    started = time.perf_counter()
+    user_ids = db.scalars(
+        update(User)
+        .where(User.last_check_in_date < yesterday, User.current_streak > 0)
+        .values(current_streak=0)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)).all()
+    db.commit()
+
+    result = SweepResult(rows=len(user_ids), seconds=time.perf_counter() - started,
+                         finished_at=time.time(), user_ids=user_ids)
+    last_sweep = result
+    logger.info("streak sweep reset %d users in %.3fs", result.rows, result.seconds)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from exports import EXPORT_FORMATS, EXPORT_TABLES, export_chunks, open_output
+
+    parser = argparse.ArgumentParser(description="Maintenance jobs for the Daily Streak API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "migrate", help="Create missing tables; run on deploy when STARTUP_MODE=lazy")
+    recompute = commands.add_parser(
+        "recompute", help="Rebuild streaks, XP and bonuses from the checkins table")
+    recompute.add_argument("--chunk-size", type=int, default=1000,
+                           help="Users per transaction (default: 1000)")
+
+    backfill = commands.add_parser(
+        "backfill-rollups", help="Rebuild the weekly and monthly XP rollups from the checkins table")
+    backfill.add_argument("--chunk-size", type=int, default=1000,
+                          help="Users per transaction (default: 1000)")
+
+    archive = commands.add_parser(
+        "archive", help="Fold old check-ins into per-user day bitmaps")
+    archive.add_argument("--keep-days", type=int, required=True,
+                         help="Keep the check-ins of the last N days as rows")
+    archive.add_argument("--chunk-size", type=int, default=1000,
+                         help="Users per transaction (default: 1000)")
+
+    export = commands.add_parser(
+        "export", help="Stream a table as CSV or NDJSON for analytics")
+    export.add_argument("table", choices=sorted(EXPORT_TABLES))
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export.add_argument("--since-id", type=int,
+                        help="Only rows with a greater id, for incremental exports")
+    export.add_argument("--since-date", type=date.fromisoformat,
+                        help="Only users active, or check-ins made, on or after this day")
+    export.add_argument("--output", help="File to write (default: stdout)")
+    export.add_argument("--gzip", action="store_true", help="Gzip the output")
+
+    rebalance = commands.add_parser(
+        "rebalance", help="Copy all users into K new shard databases")
+    rebalance.add_argument("--to-shards", type=int, required=True,
+                           help="Number of target shards")
+    rebalance.add_argument("--to", dest="template",
+                           help="Target URL template with {shard} "
+                                "(default: SHARD_URL_TEMPLATE)")
+    rebalance.add_argument("--from", dest="sources", nargs="+",
+                           help="Source database URLs (default: the current shards, "
+                                "or DATABASE_URL if SHARDS=0)")
+    rebalance.add_argument("--chunk-size", type=int, default=5000,
+                           help="Rows per read from a source (default: 5000)")
+
+    commands.add_parser(
+        "sweep", help="Reset the streaks of users who missed a day")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    # Imported here so --help works without touching the database
+    from database_utils import Session, engine
+
+    if args.command == "migrate":
+        migrate(engine)
+    elif args.command == "recompute":
+        result = recompute_streaks(Session, chunk_size=args.chunk_size)
+        logger.info(
+            "done: %d users (%d updated), %d check-ins (%d updated), %d rollup rows in %.1fs",
+            result.users, result.users_updated, result.checkins,
+            result.checkins_updated, result.rollups, result.seconds)
+    elif args.command == "backfill-rollups":
+        logger.info("done: %d rollup rows", backfill_rollups(Session, chunk_size=args.chunk_size))
+    elif args.command == "archive":
+        result = archive_checkins(Session, date.today() - timedelta(days=args.keep_days),
+                                  chunk_size=args.chunk_size)
+        logger.info("done: %d check-ins of %d users archived in %.1fs",
+                    result.checkins, result.users, result.seconds)
+        if result.skipped_users:
+            logger.warning("skipped %d users whose stored XP differs from their streaks; "
+                           "run `recompute`, then archive again", len(result.skipped_users))
+    elif args.command == "export":
+        with Session() as db, open_output(args.output, args.gzip) as out:
+            for chunk in export_chunks(db, args.table, args.format,
+                                       args.since_id, args.since_date):
+                out.write(chunk)
+    elif args.command == "rebalance":
+        from config import DATABASE_URL, SHARD_URL_TEMPLATE, SHARDS
+        from shards import rebalance as rebalance_shards, shard_urls
+
+        sources = args.sources or (shard_urls() if SHARDS > 0 else [DATABASE_URL])
+        targets = shard_urls(args.to_shards, args.template or SHARD_URL_TEMPLATE)
+        if set(sources) & set(targets):
+            parser.error("sources and targets must be different databases")
+        copied = rebalance_shards(sources, targets, chunk_size=args.chunk_size,
+                                  progress=lambda table, rows: logger.info("%s: %d rows", table, rows))
+        logger.info("done: %s", ", ".join(f"{rows} {table}" for table, rows in copied.items()))
+    elif args.command == "sweep":
+        with Session() as db:
+            sweep_expired_streaks(db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("daily_streak.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# Statements kept per request for the slow-request trace
+MAX_TRACED_STATEMENTS = 50
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_labels(**labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = [counts, total + value, count + 1]
+
+    def count(self, **labels: str) -> int:
+        item = self._values.get(_labels(**labels))
+        return item[2] if item else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = _format_labels(labels, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{le} {bucket_count}")
+                le = _format_labels(labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds counters and histograms, plus gauges read at scrape time."""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        """Register a gauge whose value is read by calling `read` on every scrape."""
+        self._gauges.append((name, help, read))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for name, help, read in self._gauges:
+            try:
+                value = read()
+            except Exception:
+                logger.exception("reading gauge %s failed", name)
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route")
+requests_total = registry.counter(
+    "http_requests_total", "Requests by route and status code")
+request_queries = registry.histogram(
+    "http_request_db_queries", "SQL statements issued per request", QUERY_COUNT_BUCKETS)
+request_sql_seconds = registry.counter(
+    "http_request_db_seconds_total", "Time spent executing SQL by route")
+background_queries = registry.counter(
+    "db_background_queries_total", "SQL statements issued outside a request")
+
+
+@dataclass
+class RequestStats:
+    """SQL work attributed to the request being served."""
+    queries: int = 0
+    sql_seconds: float = 0.0
+    trace: bool = False
+    statements: List[Tuple[str, float]] = field(default_factory=list)
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is None:
+        background_queries.inc()
+        return
+    stats.queries += 1
+    stats.sql_seconds += elapsed
+    if stats.trace and len(stats.statements) < MAX_TRACED_STATEMENTS:
+        stats.statements.append((statement, elapsed))
+
+
+def install_sql_hooks() -> None:
+    """Count and time SQL statements on every engine, per request."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and SQL work per route.
+
+    Requests slower than `slow_request_ms` (0 disables) are logged with the
+    statements they ran.
+    """
+
+    def __init__(self, app, slow_request_ms: float = 0):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(trace=self.slow_request_ms > 0)
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            # FastAPI stores the matched route in the scope; use its template
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            request_duration.observe(elapsed, method=method, route=route)
+            requests_total.inc(method=method, route=route, status=str(status_code))
+            request_queries.observe(stats.queries, method=method, route=route)
+            request_sql_seconds.inc(stats.sql_seconds, method=method, route=route)
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                self._log_slow_request(method, scope["path"], status_code, elapsed, stats)
+
+    @staticmethod
+    def _log_slow_request(method: str, path: str, status_code: int, elapsed: float,
+                          stats: RequestStats) -> None:
+        lines = [f"slow request {method} {path} -> {status_code} in {elapsed * 1000:.1f}ms "
+                 f"({stats.queries} queries, {stats.sql_seconds * 1000:.1f}ms in SQL)"]
+        for statement, seconds in stats.statements:
+            lines.append(f"  {seconds * 1000:8.2f}ms  {' '.join(statement.split())}")
+        logger.warning("\n".join(lines))
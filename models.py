@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from sqlalchemy import (Column, Integer, String, Date, ForeignKey, Index, LargeBinary,
+                        UniqueConstraint)
 from sqlalchemy.orm import relationship
 from database_utils import Base
 from datetime import date
@@ -10,15 +11,20 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
-    total_xp = Column(Integer, default=0)
+    total_xp = Column(Integer, default=0, index=True)
     current_streak = Column(Integer, default=0)
-    last_check_in_date = Column(Date, nullable=True)
+    last_check_in_date = Column(Date, nullable=True, index=True)
 
     checkins = relationship("CheckIn", back_populates="user")
 
 
 class CheckIn(Base):
     __tablename__ = "checkins"
+    __table_args__ = (
+        # One check-in per user per day, also the index for per-user lookups
+        UniqueConstraint("user_id", "checkin_date",
+                         name="uq_checkins_user_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -26,3 +32,36 @@ class CheckIn(Base):
     xp_earned = Column(Integer, default=10)
 
     user = relationship("User", back_populates="checkins")
+
+
+class XpRollup(Base):
+    """XP earned per user per ISO week or calendar month, kept up to date by check-ins."""
+    __tablename__ = "xp_rollups"
+
+    period = Column(String, primary_key=True)  # "week" or "month"
+    period_start = Column(Date, primary_key=True)  # Monday, or the 1st
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    xp = Column(Integer, nullable=False, default=0)
+    checkins = Column(Integer, nullable=False, default=0)
+
+
+# Top-N of one period is an index range scan in leaderboard order
+Index("ix_xp_rollups_board", XpRollup.period, XpRollup.period_start,
+      XpRollup.xp.desc(), XpRollup.user_id)
+
+
+class CheckInBitmap(Base):
+    """
+    Archived check-ins of one user, one bit per day.
+
+    Bit i (least significant first) is set if the user checked in on
+    epoch + i days. The archive job folds checkins rows older than a cutoff
+    in here and deletes them.
+    """
+    __tablename__ = "checkin_bitmaps"
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    epoch = Column(Date, nullable=False)
+    days = Column(LargeBinary, nullable=False)
+    # Every check-in before this day lives in the bitmap, not in checkins
+    archived_before = Column(Date, nullable=False)
@@ -1,4 +1,5 @@
 import random
+from typing import Optional
 
 # Motivational messages categorized by streak ranges
 motivational_messages = {
@@ -107,19 +108,23 @@ motivational_messages = {
 }
 
 
-def get_motivational_message(streak_count: int, is_comeback: bool = False) -> str:
+def get_motivational_message(streak_count: int, is_comeback: bool = False,
+                             seed: Optional[str] = None) -> str:
     """
     Get a random motivational message based on the user's streak count.
 
     Args:
         streak_count (int): The current streak count
         is_comeback (bool): Whether this is a comeback after breaking a streak
+        seed (str): Makes the pick deterministic, e.g. "<user_id>:<date>" so
+            a retried check-in gets the same message
 
     Returns:
         str: A motivational message appropriate for the streak level
     """
+    chooser = random.Random(seed) if seed is not None else random
     if is_comeback:
-        return random.choice(motivational_messages["comeback"])
+        return chooser.choice(motivational_messages["comeback"])
 
     # Check for special milestones first
     if streak_count in motivational_messages["milestones"]:
@@ -140,4 +145,4 @@ def get_motivational_message(streak_count: int, is_comeback: bool = False) -> st
         category = motivational_messages["legend"]
 
     # Return random message from appropriate category
-    return random.choice(category)
+    return chooser.choice(category)
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import User, XpRollup
+from schemas import LeaderboardEntry
+from streaks import live_streak
+
+PERIODS = ("week", "month")
+
+# (user_id, checkin_date, xp_earned) of one check-in
+CheckInXp = Tuple[int, date, int]
+
+
+def period_start(period: str, day: date) -> date:
+    """First day of the ISO week (Monday) or calendar month containing `day`."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period '{period}'")
+
+
+def rollup_rows(check_ins: Iterable[CheckInXp]) -> List[dict]:
+    """Aggregate check-ins into one xp_rollups row per (period, start, user)."""
+    totals: Dict[Tuple[str, date, int], List[int]] = defaultdict(lambda: [0, 0])
+    for user_id, day, xp in check_ins:
+        for period in PERIODS:
+            total = totals[(period, period_start(period, day), user_id)]
+            total[0] += xp
+            total[1] += 1
+    return [{"period": period, "period_start": start, "user_id": user_id,
+             "xp": xp, "checkins": count}
+            for (period, start, user_id), (xp, count) in totals.items()]
+
+
+def add_xp(db: Session, check_ins: Iterable[CheckInXp]) -> None:
+    """Add check-ins to the rollups in the session's open transaction."""
+    rows = rollup_rows(check_ins)
+    if not rows:
+        return
+    rollups = XpRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(rollups)
+        statement = statement.on_conflict_do_update(
+            index_elements=[rollups.c.period, rollups.c.period_start, rollups.c.user_id],
+            set_={"xp": rollups.c.xp + statement.excluded.xp,
+                  "checkins": rollups.c.checkins + statement.excluded.checkins})
+        db.execute(statement, rows)
+        return
+
+    # No ON CONFLICT: update existing rows, insert the rest
+    for row in rows:
+        updated = db.execute(
+            update(rollups)
+            .where(rollups.c.period == row["period"],
+                   rollups.c.period_start == row["period_start"],
+                   rollups.c.user_id == row["user_id"])
+            .values(xp=rollups.c.xp + row["xp"],
+                    checkins=rollups.c.checkins + row["checkins"]))
+        if not updated.rowcount:
+            db.execute(rollups.insert().values(**row))
+
+
+def top_entries(db: Session, period: str, day: date, offset: int = 0,
+                limit: int = 10) -> List[LeaderboardEntry]:
+    """
+    Return a page of the leaderboard for the week or month containing `day`.
+
+    Reads walk ix_xp_rollups_board in order, so a page costs about the same
+    whatever the size of the checkins table.
+    """
+    rows = db.execute(
+        select(XpRollup.user_id, User.username, XpRollup.xp, User.current_streak,
+               User.last_check_in_date)
+        .join(User, User.id == XpRollup.user_id)
+        .where(XpRollup.period == period,
+               XpRollup.period_start == period_start(period, day))
+        .order_by(XpRollup.xp.desc(), XpRollup.user_id)
+        .offset(offset).limit(limit)).all()
+    return [LeaderboardEntry(rank=offset + position + 1, user_id=row.user_id,
+                             username=row.username, total_xp=row.xp,
+                             current_streak=live_streak(row.current_streak or 0,
+                                                        row.last_check_in_date, day))
+            for position, row in enumerate(rows)]
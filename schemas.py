@@ -1,11 +1,7 @@
-from typing import Optional, List
-from pydantic import BaseModel, Field, EmailStr
+from typing import Dict, Optional, List
+from pydantic import AliasChoices, BaseModel, Field, EmailStr
 from datetime import date
 
-from fastapi import FastAPI
-
-app = FastAPI()
-
 
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=2, max_length=50,
@@ -25,8 +21,10 @@ class UserResponse(BaseModel):
     total_xp: int = Field(..., ge=0, description="Total XP earned by the user")
     current_streak: int = Field(...,
                                 description="Current streak of consecutive check-ins")
+    # The column is User.last_check_in_date; the API name predates it
     last_checkin_date: Optional[date] = Field(
-        None, description="Date of the last check-in by the user"
+        None, validation_alias=AliasChoices("last_checkin_date", "last_check_in_date"),
+        description="Date of the last check-in by the user"
     )
 
 
@@ -48,8 +46,65 @@ class CheckInResponse(BaseModel):
 class LeaderboardEntry(BaseModel):
     rank: int = Field(..., ge=1,
                       description="Rank of the user in the leaderboard")
+    user_id: int = Field(..., description="Unique identifier for the user")
     username: str = Field(..., min_length=2, max_length=50,
                           description="Username of the user")
-    total_xp: int = Field(..., ge=0, description="Total XP earned by the user")
+    total_xp: int = Field(..., ge=0,
+                          description="XP earned by the user, in total or in the ranked period")
     current_streak: int = Field(...,
                                 description="Current streak of consecutive check-ins")
+
+
+class UserRankResponse(BaseModel):
+    user: LeaderboardEntry = Field(...,
+                                   description="Leaderboard entry of the requested user")
+    above: List[LeaderboardEntry] = Field(
+        ..., description="Entries ranked directly above the user")
+    below: List[LeaderboardEntry] = Field(
+        ..., description="Entries ranked directly below the user")
+    total_users: int = Field(..., ge=0,
+                             description="Number of ranked users")
+
+
+class CheckInBatchRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=5000,
+                                description="IDs of the users checking in")
+
+
+class CheckInBatchResult(CheckInResponse):
+    user_id: int = Field(..., description="ID of the user this result is for")
+    status_code: int = Field(
+        200, description="HTTP status the single check-in endpoint would have returned")
+
+
+class UserImportError(BaseModel):
+    line: int = Field(..., ge=1, description="Line of the import body")
+    username: Optional[str] = Field(
+        None, description="Username on that line, if it could be parsed")
+    error: str = Field(..., description="Why the row was not imported")
+
+
+class UserImportResponse(BaseModel):
+    received: int = Field(..., ge=0, description="Number of data rows read")
+    inserted: int = Field(..., ge=0, description="Number of users created")
+    failed: int = Field(..., ge=0, description="Number of rows rejected")
+    errors: List[UserImportError] = Field(
+        ..., description="Rejected rows with the reason")
+
+
+class CheckInHistoryResponse(BaseModel):
+    user_id: int = Field(..., description="Unique identifier for the user")
+    first_checkin_date: Optional[date] = Field(
+        None, description="Date of the user's first check-in")
+    last_checkin_date: Optional[date] = Field(
+        None, description="Date of the user's latest check-in")
+    total_checkins: int = Field(..., ge=0,
+                                description="Number of days checked in")
+    longest_streak: int = Field(..., ge=0,
+                                description="Longest run of consecutive check-ins ever")
+    current_streak: int = Field(..., ge=0,
+                                description="Run of consecutive check-ins ending today or yesterday")
+    days_active: int = Field(..., ge=0,
+                             description="Number of days checked in within the requested range")
+    heatmap: Dict[date, int] = Field(
+        ..., description="XP earned per check-in day within the requested range")
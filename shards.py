@@ -0,0 +1,172 @@
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import DB_PROFILE, SHARD_URL_TEMPLATE, SHARDS
+from database_utils import Base, create_db_engine
+from models import User, CheckIn, CheckInBitmap, XpRollup
+
+T = TypeVar("T")
+
+# Tables copied by rebalance(), parents first. Check-in ids are left out:
+# they are only unique within one shard, so the target assigns new ones.
+REBALANCED_TABLES = (
+    (User.__table__, "id", ()),
+    (CheckIn.__table__, "user_id", ("id",)),
+    (XpRollup.__table__, "user_id", ()),
+    (CheckInBitmap.__table__, "user_id", ()),
+)
+REBALANCE_CHUNK_SIZE = 5000
+
+
+class ShardSet:
+    """
+    K databases holding disjoint sets of users, with everything keyed by them.
+
+    A user lives on shard `user_id % K`: new users get ids congruent to
+    their shard, allocated by the shard itself, so every shard can create
+    users without coordinating with the others. Which shard a new user goes
+    to is a hash of the username, which spreads users evenly. rebalance()
+    keeps users' ids, not that placement, so uniqueness checks of usernames
+    and emails look at every shard.
+    """
+
+    def __init__(self, urls: Sequence[str], profile: str = DB_PROFILE):
+        if not urls:
+            raise ValueError("A shard set needs at least one database")
+        self.urls = list(urls)
+        self.engines = [create_db_engine(url, profile) for url in self.urls]
+        self.sessions = [sessionmaker(autoflush=False, autocommit=False, bind=shard_engine)
+                         for shard_engine in self.engines]
+        self._pool = ThreadPoolExecutor(max_workers=len(self.urls),
+                                        thread_name_prefix="shard-scatter")
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def shard_of(self, user_id: int) -> int:
+        return user_id % len(self)
+
+    def session_for(self, user_id: int) -> Session:
+        """A new session on the shard holding `user_id`."""
+        return self.sessions[self.shard_of(user_id)]()
+
+    def shard_for_username(self, username: str) -> int:
+        """Where a new user goes; stable across processes, unlike hash()."""
+        return zlib.crc32(username.lower().encode()) % len(self)
+
+    def next_user_id(self, shard: int):
+        """SQL expression for the next free id on `shard`, evaluated by the INSERT itself."""
+        return select(func.coalesce(func.max(User.id), shard) + len(self)).scalar_subquery()
+
+    def gather(self, calls: Sequence[Tuple[int, Callable[[Session], T]]]) -> List[T]:
+        """Run each (shard, work) pair with a session on that shard, in parallel; results in order."""
+        def run(call: Tuple[int, Callable[[Session], T]]) -> T:
+            shard, work = call
+            with self.sessions[shard]() as db:
+                return work(db)
+
+        if len(calls) == 1:
+            return [run(calls[0])]
+        return list(self._pool.map(run, calls))
+
+    def scatter(self, work: Callable[[Session], T],
+                shards: Optional[Iterable[int]] = None) -> List[T]:
+        """Run `work` on every shard, or just `shards`, in parallel; results in shard order."""
+        if shards is None:
+            shards = range(len(self))
+        return self.gather([(shard, work) for shard in shards])
+
+    def migrate(self) -> None:
+        for shard_engine in self.engines:
+            Base.metadata.create_all(bind=shard_engine)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        for shard_engine in self.engines:
+            shard_engine.dispose()
+
+
+def merge_sorted(parts: Iterable[Iterable[T]], key: Callable[[T], object],
+                 offset: int = 0, limit: Optional[int] = None) -> Iterator[T]:
+    """Lazy k-way merge of per-shard results that are each sorted by `key`, then sliced."""
+    merged = heapq.merge(*parts, key=key)
+    return islice(merged, offset, None if limit is None else offset + limit)
+
+
+def shard_urls(count: int = SHARDS, template: str = SHARD_URL_TEMPLATE) -> List[str]:
+    return [template.format(shard=shard) for shard in range(count)]
+
+
+_shards: Optional[ShardSet] = None
+
+
+def get_shards() -> ShardSet:
+    """The configured shard set, created on first use. Dependency of the sharded routes."""
+    global _shards
+    if _shards is None:
+        _shards = ShardSet(shard_urls())
+    return _shards
+
+
+def close_shards() -> None:
+    """Dispose of the configured shard set, if it was created."""
+    global _shards
+    if _shards is not None:
+        _shards.close()
+        _shards = None
+
+
+def rebalance(source_urls: Sequence[str], target_urls: Sequence[str],
+              chunk_size: int = REBALANCE_CHUNK_SIZE,
+              progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Copy every user, with their rows, from the source databases to the shard
+    `user_id % len(target_urls)` of the targets.
+
+    Sources can be the unsharded database or an old shard set; the targets
+    must be new, empty databases. Stop writes while it runs, then point
+    SHARDS/SHARD_URL_TEMPLATE at the targets. Ids of users are kept, so
+    their shard is fixed by the new K; check-ins get new ids.
+
+    Returns:
+        dict: Rows copied per table.
+    """
+    targets = ShardSet(target_urls)
+    copied = {table.name: 0 for table, _, _ in REBALANCED_TABLES}
+    try:
+        targets.migrate()
+        if any(targets.scatter(lambda db: db.scalar(select(User.id).limit(1)))):
+            raise ValueError("Target shards must be empty")
+        for url in source_urls:
+            source_engine = create_db_engine(url)
+            try:
+                # Older databases may predate some of the tables
+                Base.metadata.create_all(bind=source_engine)
+                with source_engine.connect() as source:
+                    for table, key, skipped in REBALANCED_TABLES:
+                        columns = [column for column in table.c if column.name not in skipped]
+                        result = source.execution_options(yield_per=chunk_size).execute(
+                            select(*columns).order_by(table.c[key]))
+                        for rows in result.partitions():
+                            by_shard: Dict[int, List[dict]] = {}
+                            for row in rows:
+                                values = row._asdict()
+                                by_shard.setdefault(
+                                    targets.shard_of(values[key]), []).append(values)
+                            for shard, values in by_shard.items():
+                                with targets.engines[shard].begin() as target:
+                                    target.execute(insert(table), values)
+                            copied[table.name] += len(rows)
+                            if progress is not None:
+                                progress(table.name, copied[table.name])
+            finally:
+                source_engine.dispose()
+    finally:
+        targets.close()
+    return copied
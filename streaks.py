@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import case
+
+
+class StreakSummary(NamedTuple):
+    first_day: int
+    last_day: int
+    active_days: int
+    longest_streak: int
+    current_streak: int
+
+
+def summarize_days(days: Iterable[int], today: int) -> StreakSummary:
+    """
+    Summarize check-in days in a single pass.
+
+    Args:
+        days (Iterable[int]): Check-in days as date ordinals, ascending.
+        today (int): Today's date ordinal.
+
+    Returns:
+        StreakSummary: Zeroed if there are no days. current_streak is the run
+            ending today or yesterday, 0 once it has lapsed.
+    """
+    first = last = None
+    active = longest = run = 0
+    for day in days:
+        if last is not None and day == last:
+            continue
+        run = run + 1 if last is not None and day == last + 1 else 1
+        longest = max(longest, run)
+        if first is None:
+            first = day
+        last = day
+        active += 1
+
+    if last is None:
+        return StreakSummary(0, 0, 0, 0, 0)
+    current = run if last >= today - 1 else 0
+    return StreakSummary(first, last, active, longest, current)
+
+
+def live_streak(current_streak: int, last_check_in_date: Optional[date], today: date) -> int:
+    """
+    The streak to serve for a stored user: 0 once it has lapsed.
+
+    The sweep zeroes lapsed streaks in the database on its own schedule, so
+    copies of a user held in memory apply the same rule when they are read.
+
+    Args:
+        current_streak (int): The stored streak.
+        last_check_in_date (date): The user's last check-in, if any.
+        today (date): The current date.
+
+    Returns:
+        int: `current_streak`, or 0 if the last check-in was before yesterday.
+    """
+    if last_check_in_date is not None and last_check_in_date < today - timedelta(days=1):
+        return 0
+    return current_streak
+
+
+def update_user_streak(user, today: date) -> tuple[bool, int]:
+    """
+    Update the user streak 
+
+    Args:
+        user (User): The user object to update (anything with last_check_in_date
+            and current_streak).
+        today (date): The current date.
+
+    Returns:
+        tuple: (is_comeback (bool): Whether the user is making a comeback,
+                current_streak (int): The current streak count.
+            )
+    """
+    is_comeback = False
+
+    if user.last_check_in_date is None:
+        user.current_streak = 1
+
+    elif user.last_check_in_date == today - timedelta(days=1):
+        user.current_streak += 1
+
+    else:
+        user.current_streak = 1
+        is_comeback = True
+
+    return is_comeback, user.current_streak
+
+
+def calculate_milestone_bonus(streak: int) -> int:
+    """
+    Calculate bonus XP based on streak milestones.
+
+    Args:
+        streak (int): The current streak count.
+
+    Returns:
+        int: Bonus XP for the current streak.
+    """
+    if streak % 100 == 0:
+        return 500
+    elif streak % 30 == 0:
+        return 200
+    elif streak % 7 == 0:
+        return 50
+    return 0
+
+
+def milestone_bonus_expr(streak):
+    """
+    SQL counterpart of calculate_milestone_bonus.
+
+    Args:
+        streak: SQL expression for the streak count.
+
+    Returns:
+        A CASE expression evaluating to the bonus XP for that streak.
+    """
+    return case(
+        (streak % 100 == 0, 500),
+        (streak % 30 == 0, 200),
+        (streak % 7 == 0, 50),
+        else_=0)
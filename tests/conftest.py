@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from admission import check_in_bucket
+from cache import idempotency_cache, user_cache
+from database_utils import Base, get_db
+from leaderboard import reset_leaderboard_indexes
+from main import app
+from models import User, CheckIn, CheckInBitmap, XpRollup
+from tests.query_budget import QueryBudget
+from write_behind import stop_check_in_writers
+
+# Setup the test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./tests/test.db"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    try:
+        db = TestingSession()
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_database():
+    """Create database once for all tests."""
+
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Create a single test client for all tests."""
+    return TestClient(app)
+
+
+@pytest.fixture
+def clean_db():
+    """Clean database between tests that need isolation."""
+    stop_check_in_writers()
+    db = TestingSession()
+    try:
+        # Delete all records (keeping tables)
+        db.query(XpRollup).delete()
+        db.query(CheckInBitmap).delete()
+        db.query(CheckIn).delete()
+        db.query(User).delete()
+        db.commit()
+    finally:
+        db.close()
+    reset_leaderboard_indexes()
+    user_cache.clear()
+    idempotency_cache.clear()
+    check_in_bucket.clear()
+
+
+class FakeClock:
+    """A clock for time-based code that only moves when a test sets `now`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A FakeClock starting at 0."""
+    return FakeClock()
+
+
+@pytest.fixture
+def create_user():
+    """Create a user through `client`; returns the response body."""
+    def create(client, username):
+        return client.post(
+            "/users/", json={"username": username, "email": f"{username}@gmail.com"}).json()
+    return create
+
+
+@pytest.fixture
+def query_budget():
+    """Hold a block of requests to a SQL statement (and time) budget."""
+    return QueryBudget()
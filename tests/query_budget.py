@@ -0,0 +1,78 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Most SQL statements each endpoint may issue, with cold caches and a cold
+# leaderboard index. Lower a budget when a change saves a query; raising
+# one needs a reason in review.
+BUDGETS = {
+    "POST /users/": 2,
+    "GET /users/": 1,
+    "GET /users/{id}": 1,
+    "GET /users/{id}/history": 2,
+    "GET /users/{id}/rank": 1,
+    "POST /checkin/": 3,
+    "POST /checkin/ (repeat)": 2,
+    "POST /checkin/batch": 4,
+    "GET /leaderboard/": 1,
+    "GET /leaderboard/?period=week": 1,
+}
+
+
+class QueryBudget:
+    """
+    Records the SQL statements issued on any engine while a block runs.
+
+    Use as `with query_budget("POST /checkin/"): ...` to hold the block to
+    the endpoint's entry in BUDGETS, or pass `max_statements` and
+    `max_sql_ms` directly. Going over fails the test and lists the
+    statements that ran.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements: List[Tuple[str, float]] = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("budget_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["budget_started"].pop()
+        with self._lock:
+            self.statements.append((" ".join(statement.split()), elapsed))
+
+    @property
+    def sql_ms(self) -> float:
+        return sum(seconds for _, seconds in self.statements) * 1000
+
+    @contextmanager
+    def __call__(self, endpoint: Optional[str] = None, max_statements: Optional[int] = None,
+                 max_sql_ms: Optional[float] = None):
+        if max_statements is None:
+            max_statements = BUDGETS[endpoint]
+        label = endpoint or "block"
+        self.statements = []
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+        try:
+            yield self
+        finally:
+            event.remove(Engine, "before_cursor_execute", self._before)
+            event.remove(Engine, "after_cursor_execute", self._after)
+
+        problems = []
+        if len(self.statements) > max_statements:
+            problems.append(f"{len(self.statements)} statements (budget {max_statements})")
+        if max_sql_ms is not None and self.sql_ms > max_sql_ms:
+            problems.append(f"{self.sql_ms:.1f}ms in SQL (budget {max_sql_ms}ms)")
+        if problems:
+            listing = "\n".join(f"  {number}. {seconds * 1000:7.2f}ms  {statement}"
+                                for number, (statement, seconds)
+                                in enumerate(self.statements, 1))
+            pytest.fail(f"{label} over its query budget: {', '.join(problems)}\n{listing}",
+                        pytrace=False)
@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+
+from admission import AdmissionMiddleware, TokenBucket, admitted_requests, rejected_requests
+from database_utils import get_db
+from main import sync_router
+from tests.conftest import override_get_db
+
+
+def limited_client(limits, bucket):
+    """Client for the sync routes on the test database, behind admission control."""
+    limited_app = FastAPI()
+    limited_app.include_router(sync_router)
+    limited_app.dependency_overrides[get_db] = override_get_db
+    limited_app.add_middleware(AdmissionMiddleware, limits=limits, check_in_bucket=bucket)
+    return TestClient(limited_app)
+
+
+class TestTokenBucket:
+
+    def test_burst_then_refill(self, clock):
+        """Test that tokens run out and come back at the configured rate."""
+        bucket = TokenBucket(rate=1, burst=2, clock=clock)
+        assert bucket.take("a") == bucket.take("a") == 0
+        assert bucket.take("a") == 1.0
+        assert bucket.take("b") == 0
+        clock.now = 0.5
+        assert bucket.take("a") == 0.5
+        clock.now = 1.5
+        assert bucket.take("a") == 0
+
+    def test_least_recently_used_keys_are_dropped(self, clock):
+        """Test the bound on tracked keys."""
+        bucket = TokenBucket(rate=1, burst=1, maxsize=2, clock=clock)
+        for key in "abc":
+            bucket.take(key)
+        assert len(bucket) == 2
+        # "a" was dropped, so it starts again with a full bucket
+        assert bucket.take("a") == 0
+
+
+class TestAdmissionMiddleware:
+
+    def test_concurrency_limit_fails_fast(self):
+        """Test a 503 with Retry-After once a route class is full."""
+        app = FastAPI()
+        release = asyncio.Event()
+
+        @app.post("/slow")
+        async def slow():
+            await release.wait()
+            return {"ok": True}
+
+        @app.get("/read")
+        async def read():
+            return {"ok": True}
+
+        app.add_middleware(AdmissionMiddleware, limits={"write": 1}, retry_after=2)
+        rejected = rejected_requests.value(route_class="write", reason="concurrency")
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                first = asyncio.create_task(client.post("/slow"))
+                await asyncio.sleep(0.05)
+                busy = await client.post("/slow")
+                other_class = await client.get("/read")
+                release.set()
+                return await first, busy, other_class
+
+        first, busy, other_class = asyncio.run(run())
+        assert first.status_code == status.HTTP_200_OK
+        assert busy.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert busy.headers["retry-after"] == "2"
+        assert other_class.status_code == status.HTTP_200_OK
+        assert rejected_requests.value(route_class="write", reason="concurrency") == rejected + 1
+
+    def test_check_in_spam_is_rate_limited(self, clean_db, create_user):
+        """Test the per-user bucket in front of POST /checkin/."""
+        client = limited_client({}, TokenBucket(rate=0.1, burst=5))
+        spammer = create_user(client, "spammer")
+        bystander = create_user(client, "bystander")
+        admitted = admitted_requests.value(route_class="write")
+
+        # The first check-in reaches the handler with its body intact
+        assert client.post("/checkin/", json={"user_id": spammer["id"]}).status_code == 200
+        codes = [client.post("/checkin/", json={"user_id": spammer["id"]}).status_code
+                 for _ in range(5)]
+        assert codes == [400] * 4 + [429]
+        response = client.post("/checkin/", json={"user_id": spammer["id"]})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response.headers["retry-after"]) >= 1
+
+        assert client.post("/checkin/", json={"user_id": bystander["id"]}).status_code == 200
+        assert admitted_requests.value(route_class="write") == admitted + 6
+
+    def test_busy_check_ins_spend_no_tokens(self, clean_db, create_user):
+        """Test that a check-in turned away with a 503 keeps the user's token."""
+        bucket = TokenBucket(rate=0.1, burst=1)
+        user = create_user(limited_client({}, bucket), "patient")
+
+        busy = limited_client({"write": 0}, bucket).post("/checkin/", json={"user_id": user["id"]})
+        assert busy.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert bucket.take(user["id"]) == 0
+
@@ -0,0 +1,130 @@
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from database_utils import Base, get_async_db
+from main import async_router
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def async_client(tmp_path):
+    """Client for an app serving only the async routes on a scratch database."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    db_path = tmp_path / "async.db"
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{db_path}"))
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    AsyncTestingSession = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSession() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(async_router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    with TestClient(async_app) as client:
+        yield client
+
+
+class TestAsyncMode:
+
+    def test_create_user_and_check_in(self, async_client):
+        """Test the user and check-in flow through the async session."""
+        response = async_client.post(
+            "/users/", json={"username": "asyncuser", "email": "async@gmail.com"})
+        assert response.status_code == status.HTTP_200_OK
+        user = response.json()
+
+        response = async_client.post("/checkin/", json={"user_id": user["id"]})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["current_streak"] == 1
+
+        response = async_client.post("/checkin/", json={"user_id": user["id"]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_missing_user_returns_404(self, async_client):
+        """Test user lookup for a non-existent user."""
+        response = async_client.get("/users/9999")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_leaderboard_orders_by_xp(self, async_client):
+        """Test the leaderboard through the async session."""
+        first = async_client.post(
+            "/users/", json={"username": "first", "email": "first@gmail.com"}).json()
+        async_client.post(
+            "/users/", json={"username": "second", "email": "second@gmail.com"})
+        async_client.post("/checkin/", json={"user_id": first["id"]})
+
+        response = async_client.get("/leaderboard/")
+        assert response.status_code == status.HTTP_200_OK
+        assert [u["username"] for u in response.json()] == ["first", "second"]
+
+    def test_users_ndjson_stream(self, async_client):
+        """Test the streaming listing through the async session."""
+        for name in ("streamone", "streamtwo"):
+            async_client.post(
+                "/users/", json={"username": name, "email": f"{name}@gmail.com"})
+
+        response = async_client.get("/users/", params={"format": "ndjson"})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.text.splitlines()) == 2
+
+    def test_concurrent_first_leaderboard_reads(self, async_client):
+        """Test that concurrent requests loading the index do not deadlock."""
+        import asyncio
+        import httpx
+
+        for i in range(3):
+            async_client.post(
+                "/users/", json={"username": f"loader{i}", "email": f"loader{i}@gmail.com"})
+
+        async def read_concurrently():
+            transport = httpx.ASGITransport(app=async_client.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.wait_for(asyncio.gather(
+                    *(client.get("/leaderboard/") for _ in range(8))), timeout=10)
+
+        responses = asyncio.run(read_concurrently())
+        assert {len(r.json()) for r in responses} == {3}
+
+    def test_durable_write_behind_check_ins(self, async_client, monkeypatch):
+        """Test that waiting for a group commit does not block the event loop."""
+        import asyncio
+        import httpx
+        import main
+        from write_behind import stop_check_in_writers
+
+        monkeypatch.setattr(main, "WRITE_BEHIND", True)
+        users = [async_client.post("/users/", json={
+            "username": f"behind{i}", "email": f"behind{i}@gmail.com"}).json() for i in range(5)]
+
+        async def check_in_concurrently():
+            transport = httpx.ASGITransport(app=async_client.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.wait_for(asyncio.gather(
+                    *(client.post("/checkin/", json={"user_id": user["id"]})
+                      for user in users)), timeout=10)
+
+        try:
+            responses = asyncio.run(check_in_concurrently())
+        finally:
+            stop_check_in_writers()
+        assert {r.status_code for r in responses} == {status.HTTP_200_OK}
+        leaderboard = async_client.get("/leaderboard/").json()
+        assert {entry["total_xp"] for entry in leaderboard} == {10}
+
+    def test_export_stream(self, async_client):
+        """Test a CSV export from the async server-side cursor."""
+        for name in ("exportone", "exporttwo"):
+            async_client.post("/users/", json={"username": name, "email": f"{name}@gmail.com"})
+        response = async_client.get("/export/users", params={"since_id": 1})
+        assert response.status_code == status.HTTP_200_OK
+        lines = response.text.splitlines()
+        assert lines[0] == "id,username,email,total_xp,current_streak,last_check_in_date"
+        assert lines[1:] == ["2,exporttwo,exporttwo@gmail.com,0,0,"]
@@ -0,0 +1,98 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from main import check_in
+from models import User, CheckIn
+from schemas import CheckInRequest
+from tests.conftest import TestingSession
+
+
+def add_user(username, **fields):
+    db = TestingSession()
+    try:
+        user = User(username=username, email=f"{username}@gmail.com", **fields)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+class TestAtomicCheckIn:
+
+    def test_streak_and_bonus_are_computed_in_the_update(self, clean_db):
+        """Test a consecutive check-in reaching a milestone."""
+        user_id = add_user("atomicstreak", current_streak=29, total_xp=400,
+                           last_check_in_date=date.today() - timedelta(days=1))
+        db = TestingSession()
+        try:
+            response = check_in(CheckInRequest(user_id=user_id), db=db)
+        finally:
+            db.close()
+
+        assert response.current_streak == 30
+        assert response.milestone_bonus == 200
+        assert response.xp_earned == 210
+        assert response.total_xp == 610
+
+    def test_lapsed_streak_restarts_at_one(self, clean_db):
+        """Test a check-in after a break."""
+        user_id = add_user("atomiclapsed", current_streak=12, total_xp=200,
+                           last_check_in_date=date.today() - timedelta(days=4))
+        db = TestingSession()
+        try:
+            response = check_in(CheckInRequest(user_id=user_id), db=db)
+        finally:
+            db.close()
+
+        assert response.current_streak == 1
+        assert response.total_xp == 210
+
+    def test_concurrent_check_ins_succeed_once(self, clean_db):
+        """Test that racing check-ins for one user record a single check-in."""
+        user_id = add_user("racer")
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def attempt():
+            db = TestingSession()
+            try:
+                barrier.wait()
+                check_in(CheckInRequest(user_id=user_id), db=db)
+                outcomes.append(200)
+            except HTTPException as e:
+                outcomes.append(e.status_code)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=attempt) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(outcomes) == [200] + [400] * 7
+        db = TestingSession()
+        try:
+            assert db.query(CheckIn).filter(CheckIn.user_id == user_id).count() == 1
+            assert db.get(User, user_id).total_xp == 10
+        finally:
+            db.close()
+
+    def test_duplicate_checkin_row_is_rejected_by_the_database(self, clean_db):
+        """Test the unique constraint on (user_id, checkin_date)."""
+        user_id = add_user("uniquecheckin")
+        db = TestingSession()
+        try:
+            db.add(CheckIn(user_id=user_id, checkin_date=date.today()))
+            db.commit()
+            db.add(CheckIn(user_id=user_id, checkin_date=date.today()))
+            with pytest.raises(IntegrityError):
+                db.commit()
+        finally:
+            db.rollback()
+            db.close()
@@ -1,58 +1,7 @@
-import pytest
 from datetime import date, timedelta
-from fastapi.testclient import TestClient
 from fastapi import status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from database_utils import Base, get_db
-from main import app, update_user_streak, calculate_milestone_bonus
-from models import User, CheckIn
-
-# Setup the test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./tests/test.db"
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-
-TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-def override_get_db():
-    try:
-        db = TestingSession()
-        yield db
-    finally:
-        db.close()
-
-
-app.dependency_overrides[get_db] = override_get_db
-
-
-@pytest.fixture(scope="session", autouse=True)
-def setup_database():
-    """Create database once for all tests."""
-
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
-
-
-@pytest.fixture(scope="session")
-def client():
-    """Create a single test client for all tests."""
-    return TestClient(app)
-
-
-@pytest.fixture
-def clean_db():
-    """Clean database between tests that need isolation."""
-    db = TestingSession()
-    try:
-        # Delete all records (keeping tables)
-        db.query(CheckIn).delete()
-        db.query(User).delete()
-        db.commit()
-    finally:
-        db.close()
+from main import update_user_streak, calculate_milestone_bonus
+from models import User
 
 
 class TestBasicFunctionality:
@@ -166,6 +115,17 @@ class TestStreakLogic:
         assert is_comeback == True
         assert streak == 1
 
+    def test_update_user_streak_across_month_boundary(self):
+        """Test that yesterday is found on the first of a month."""
+        user = User(username="monthuser", email="month@gamil.com")
+        user.current_streak = 3
+        user.last_check_in_date = date(2025, 2, 28)
+
+        is_comeback, streak = update_user_streak(user, date(2025, 3, 1))
+
+        assert is_comeback == False
+        assert streak == 4
+
 
 class TestMilestoneBonus:
 
@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+from fastapi import status
+import main
+from models import User, CheckIn
+from tests.conftest import TestingSession
+
+
+class TestBatchCheckIn:
+
+    def test_batch_check_in_returns_result_per_user(self, client, clean_db, create_user):
+        """Test that every submitted user id gets its own result."""
+        first = create_user(client, "batchone")
+        second = create_user(client, "batchtwo")
+
+        response = client.post(
+            "/checkin/batch", json={"user_ids": [first["id"], 9999, second["id"], first["id"]]})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+
+        assert [r["user_id"] for r in results] == [
+            first["id"], 9999, second["id"], first["id"]]
+        assert [r["status_code"] for r in results] == [200, 404, 200, 400]
+        assert results[0]["success"] == True
+        assert results[0]["xp_earned"] == 10
+        assert results[0]["current_streak"] == 1
+        assert results[1]["success"] == False
+        assert results[3]["success"] == False
+
+    def test_batch_check_in_writes_users_and_checkins(self, client, clean_db, create_user):
+        """Test that the batch updates streaks and records check-ins."""
+        user = create_user(client, "batchstreak")
+        db = TestingSession()
+        try:
+            db_user = db.get(User, user["id"])
+            db_user.current_streak = 6
+            db_user.total_xp = 60
+            db_user.last_check_in_date = date.today() - timedelta(days=1)
+            db.commit()
+        finally:
+            db.close()
+
+        results = client.post(
+            "/checkin/batch", json={"user_ids": [user["id"]]}).json()
+        assert results[0]["current_streak"] == 7
+        assert results[0]["milestone_bonus"] == 50
+        assert results[0]["total_xp"] == 120
+
+        db = TestingSession()
+        try:
+            db_user = db.get(User, user["id"])
+            assert db_user.current_streak == 7
+            assert db_user.total_xp == 120
+            assert db_user.last_check_in_date == date.today()
+            assert db.query(CheckIn).filter(
+                CheckIn.user_id == user["id"]).count() == 1
+        finally:
+            db.close()
+
+        # The single endpoint sees the batch check-in
+        response = client.post("/checkin/", json={"user_id": user["id"]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_concurrent_check_in_fails_only_that_user(
+            self, client, clean_db, monkeypatch, create_user):
+        """Test a check-in landing between the batch's read and write is reported per user."""
+        racer = create_user(client, "batchracer")
+        other = create_user(client, "batchother")
+        update_user_streak = main.update_user_streak
+
+        def check_in_racer_first(user, today):
+            # Runs after the batch read its users, before it writes them
+            if not hasattr(check_in_racer_first, "done"):
+                check_in_racer_first.done = True
+                with TestingSession() as db:
+                    main._check_in_now(racer["id"], db, today)
+            return update_user_streak(user, today)
+
+        monkeypatch.setattr(main, "update_user_streak", check_in_racer_first)
+        response = client.post("/checkin/batch", json={"user_ids": [racer["id"], other["id"]]})
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+        assert [r["status_code"] for r in results] == [400, 200]
+        assert results[0]["total_xp"] == 10
+        assert results[1]["total_xp"] == 10
+        db = TestingSession()
+        try:
+            assert db.query(CheckIn).filter(CheckIn.user_id == racer["id"]).count() == 1
+            assert db.get(User, other["id"]).total_xp == 10
+        finally:
+            db.close()
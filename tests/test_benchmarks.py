@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.bench_bitmaps import compare
+from benchmarks.bench_shards import measure as measure_shards
+from benchmarks.bench_startup import probe
+from benchmarks.driver import load_replay, mix_requests, parse_mix
+from benchmarks.harness import route_label, run_load, summarize_by_route
+from benchmarks.seed import seed_database
+from main import sync_router
+from models import User, CheckIn
+
+
+class TestBenchmarkSuite:
+
+    def test_route_label_groups_ids(self):
+        """Test that per-user URLs share a route."""
+        assert route_label("get", "/users/42?x=1") == "GET /users/{id}"
+        assert route_label("POST", "/checkin/") == "POST /checkin/"
+
+    def test_parse_mix_rejects_unknown_kinds(self):
+        """Test request mix parsing."""
+        assert parse_mix("checkin=1,leaderboard=3") == {"checkin": 1, "leaderboard": 3}
+        with pytest.raises(ValueError):
+            parse_mix("delete=1")
+
+    def test_load_replay_skips_non_request_lines(self, tmp_path):
+        """Test replay files mixing requests and other records."""
+        path = tmp_path / "replay.jsonl"
+        path.write_text('{"method": "GET", "path": "/leaderboard/"}\n'
+                        '{"request_id": "note"}\n\n'
+                        '{"method": "POST", "path": "/checkin/", "json": {"user_id": 1}}\n')
+        assert load_replay(str(path)) == [
+            ("GET", "/leaderboard/", None), ("POST", "/checkin/", {"user_id": 1})]
+
+    def test_seed_and_drive(self, tmp_path):
+        """Test seeding a scratch database and reporting per route."""
+        from fastapi import FastAPI
+        from sqlalchemy.orm import sessionmaker
+        from database_utils import get_db
+
+        db_path = str(tmp_path / "bench.db")
+        seed_database(db_path, users=20, checkins=200)
+        bench_engine = create_engine(f"sqlite:///{db_path}")
+        with bench_engine.connect() as conn:
+            assert conn.scalar(select(func.count()).select_from(CheckIn)) == 200
+            # Counters are derived from the generated history
+            assert conn.scalar(select(func.sum(User.total_xp))) >= 200 * 10
+
+        BenchSession = sessionmaker(bind=bench_engine)
+
+        def override_get_db():
+            with BenchSession() as db:
+                yield db
+
+        bench_app = FastAPI()
+        bench_app.include_router(sync_router)
+        bench_app.dependency_overrides[get_db] = override_get_db
+
+        samples, elapsed = asyncio.run(run_load(
+            bench_app, mix_requests(parse_mix("user=1,leaderboard=1"), users=20),
+            total=40, concurrency=4))
+        report = summarize_by_route(samples, elapsed)
+
+        assert set(report) <= {"GET /users/{id}", "GET /leaderboard/"}
+        assert sum(r["requests"] for r in report.values()) == 40
+        assert all(set(r["status_codes"]) == {"200"} for r in report.values())
+
+    def test_startup_probe_reports_timings(self, tmp_path):
+        """Test one cold start against a seeded database."""
+        db_path = str(tmp_path / "startup.db")
+        seed_database(db_path, users=5, checkins=0)
+        timings = probe(db_path, "lazy")
+
+        assert timings["status"] == 200
+        assert 0 < timings["import_ms"] <= timings["first_response_ms"]
+
+    def test_bitmap_comparison_shrinks_checkins(self, tmp_path):
+        """Test the before/after report of the archive job."""
+        report = compare(str(tmp_path / "bitmaps.db"), users=10, checkins=600,
+                         keep_days=7, reads=10)
+
+        assert report["after"]["archived_checkins"] > 0
+        assert (report["after"]["checkin_storage_bytes"]
+                < report["before"]["checkin_storage_bytes"])
+        assert report["after"]["history_median_ms"] > 0
+
+    def test_shard_benchmark_checks_in_every_user(self, tmp_path):
+        """Test one sharded check-in run against two shard files."""
+        summary = measure_shards(str(tmp_path), shards=2, users=20, concurrency=4)
+
+        assert summary["requests"] == 20
+        assert summary["errors"] == 0
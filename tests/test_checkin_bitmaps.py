@@ -0,0 +1,118 @@
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+
+from checkin_bitmaps import (DayBits, add_days, count_days, iter_days, longest_run,
+                             replay, run_ending_at, summarize_bits)
+from maintenance import archive_checkins, backfill_rollups, recompute_streaks
+from models import CheckIn, CheckInBitmap, User, XpRollup
+from streaks import summarize_days
+from tests.conftest import TestingSession
+from tests.test_history import add_history
+
+
+def history(client, user_id, **params):
+    return client.get(f"/users/{user_id}/history", params=params).json()
+
+
+class TestDayBits:
+
+    def test_bit_operations(self):
+        """Test runs, range counts and moving the epoch on a small bitmap."""
+        day_bits = add_days(None, [101, 102, 103, 105, 106])
+        assert day_bits == DayBits(101, 0b110111)
+        assert longest_run(day_bits.bits) == 3
+        assert run_ending_at(day_bits.bits, 5) == 2
+        assert run_ending_at(day_bits.bits, 3) == 0
+        assert count_days(day_bits, 90, 103) == 3
+        assert list(iter_days(day_bits)) == [101, 102, 103, 105, 106]
+        # An earlier day moves the epoch back
+        assert add_days(day_bits, [99]) == DayBits(99, 0b11011100 | 1)
+
+    def test_summary_matches_walking_the_days(self):
+        """Test summarize_bits against summarize_days on random histories."""
+        rng = random.Random(7)
+        for _ in range(200):
+            days = sorted(rng.sample(range(1000, 1100), rng.randint(1, 60)))
+            today = rng.choice([days[-1], days[-1] + 1, days[-1] + 2])
+            assert summarize_bits(add_days(None, days), today) == summarize_days(days, today)
+
+    def test_replay_assigns_milestone_xp(self):
+        """Test that the 7th day of a run earns the bonus, also mid-range."""
+        day_bits = add_days(None, range(1, 9))
+        assert [xp for _, xp in replay(day_bits)] == [10] * 6 + [60, 10]
+        assert list(replay(day_bits, start=7, end=7)) == [(7, 60)]
+
+
+class TestArchive:
+
+    def test_history_is_unchanged_by_archiving(self, client, clean_db):
+        """Test streaks and heatmap served from bitmap plus recent rows."""
+        user_id = add_history("archivist", [0, 1, 2, 5, 6, 7, 8, 9, 10, 11, 12, 400])
+        # Stored XP has to match the derived XP for the rows to be archived
+        recompute_streaks(TestingSession, progress=None)
+        before = history(client, user_id)
+        ranged = {"start": str(date.today() - timedelta(days=9)),
+                  "end": str(date.today() - timedelta(days=3))}
+        ranged_before = history(client, user_id, **ranged)
+
+        result = archive_checkins(TestingSession, date.today() - timedelta(days=1), progress=None)
+
+        assert (result.users, result.checkins) == (1, 10)
+        with TestingSession() as db:
+            assert db.scalar(select(func.count()).select_from(CheckIn)) == 2
+        assert history(client, user_id) == before
+        ranged_after = history(client, user_id, **ranged)
+        assert ranged_after["days_active"] == ranged_before["days_active"] == 5
+        assert list(ranged_after["heatmap"]) == list(ranged_before["heatmap"])
+
+    def test_users_with_stale_xp_are_not_archived(self, client, clean_db):
+        """Test that archiving never rewrites XP a recompute has not settled."""
+        # Seven days in a row stored at 10 XP each, where the 7th earns a bonus
+        stale_id = add_history("stale", range(1, 8))
+        settled_id = add_history("settled", [3])
+        before = history(client, stale_id)
+
+        result = archive_checkins(TestingSession, date.today(), progress=None)
+
+        assert result.skipped_users == [stale_id]
+        assert (result.users, result.checkins) == (1, 1)
+        assert history(client, stale_id) == before
+        with TestingSession() as db:
+            assert db.get(CheckInBitmap, settled_id) is not None
+            assert db.get(CheckInBitmap, stale_id) is None
+
+        recompute_streaks(TestingSession, progress=None)
+        result = archive_checkins(TestingSession, date.today(), progress=None)
+        assert (result.skipped_users, result.checkins) == ([], 7)
+
+    def test_archive_merges_into_existing_bitmaps(self, client, clean_db):
+        """Test a second run adding days and a user with everything archived."""
+        user_id = add_history("twice", [0, 3, 4, 30])
+        archive_checkins(TestingSession, date.today() - timedelta(days=10), progress=None)
+        archive_checkins(TestingSession, date.today(), progress=None)
+
+        with TestingSession() as db:
+            bitmap = db.get(CheckInBitmap, user_id)
+            assert bitmap.archived_before == date.today()
+            assert bitmap.epoch == date.today() - timedelta(days=30)
+        data = history(client, user_id)
+        assert (data["total_checkins"], data["longest_streak"], data["current_streak"]) == (4, 2, 1)
+
+    def test_recompute_and_backfill_include_archived_days(self, client, clean_db):
+        """Test that maintenance jobs still see archived history."""
+        user_id = add_history("keeper", range(9))
+        recompute_streaks(TestingSession, progress=None)
+        with TestingSession() as db:
+            expected = db.get(User, user_id).total_xp
+
+        archive_checkins(TestingSession, date.today() - timedelta(days=2), progress=None)
+        recompute_streaks(TestingSession, progress=None)
+        backfill_rollups(TestingSession, progress=None)
+
+        with TestingSession() as db:
+            user = db.get(User, user_id)
+            assert (user.total_xp, user.current_streak) == (expected, 9)
+            assert db.scalar(select(func.sum(XpRollup.xp))
+                             .where(XpRollup.period == "month")) == expected
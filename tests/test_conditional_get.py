@@ -0,0 +1,72 @@
+from fastapi import status
+from sqlalchemy import event
+
+from tests.conftest import engine
+
+
+def _count_statements():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements, count
+
+
+class TestUserETags:
+
+    def test_unchanged_user_answers_304_without_queries(self, client, clean_db):
+        """Test a conditional GET for a cached profile."""
+        user = client.post(
+            "/users/", json={"username": "etaguser", "email": "etag@gmail.com"}).json()
+        first = client.get(f"/users/{user['id']}")
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "private, no-cache"
+
+        statements, count = _count_statements()
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        assert statements == []
+
+    def test_check_in_changes_the_user_etag(self, client, clean_db):
+        """Test that a write invalidates the client's copy."""
+        user = client.post(
+            "/users/", json={"username": "etagwrite", "email": "etagw@gmail.com"}).json()
+        etag = client.get(f"/users/{user['id']}").headers["ETag"]
+        client.post("/checkin/", json={"user_id": user["id"]})
+
+        response = client.get(f"/users/{user['id']}", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_xp"] == 10
+        assert response.headers["ETag"] != etag
+
+
+class TestLeaderboardETags:
+
+    def test_unchanged_leaderboard_answers_304(self, client, clean_db):
+        """Test a conditional GET for a leaderboard page."""
+        client.post("/users/", json={"username": "lbetag", "email": "lbetag@gmail.com"})
+        first = client.get("/leaderboard/")
+        assert first.headers["Cache-Control"].startswith("public")
+
+        response = client.get("/leaderboard/",
+                              headers={"If-None-Match": f'"x", {first.headers["ETag"]}'})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_check_in_changes_the_leaderboard_etag(self, client, clean_db):
+        """Test that a check-in moves the leaderboard version."""
+        user = client.post(
+            "/users/", json={"username": "lbmove", "email": "lbmove@gmail.com"}).json()
+        etag = client.get("/leaderboard/").headers["ETag"]
+        client.post("/checkin/", json={"user_id": user["id"]})
+
+        response = client.get("/leaderboard/", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]["total_xp"] == 10
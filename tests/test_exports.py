@@ -0,0 +1,70 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, timedelta
+
+from fastapi import status
+
+from exports import export_chunks, open_output
+from tests.conftest import TestingSession
+from tests.test_history import add_history
+
+
+class TestExports:
+
+    def test_users_csv(self, client, clean_db):
+        """Test the CSV header, a row and the attachment name."""
+        user_id = add_history("exported", [0])
+        response = client.get("/export/users")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="users.csv"' in response.headers["content-disposition"]
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert rows == [{"id": str(user_id), "username": "exported",
+                         "email": "exported@gmail.com", "total_xp": "0",
+                         "current_streak": "0", "last_check_in_date": ""}]
+
+    def test_incremental_checkins_ndjson(self, client, clean_db):
+        """Test since_id and since_date filters on the NDJSON stream."""
+        user_id = add_history("incremental", [0, 1, 2, 3])
+        records = [json.loads(line) for line in client.get(
+            "/export/checkins", params={"format": "ndjson"}).text.splitlines()]
+        assert [r["checkin_date"] for r in records] == [
+            str(date.today() - timedelta(days=days)) for days in (0, 1, 2, 3)]
+        assert {r["user_id"] for r in records} == {user_id}
+
+        since_id = client.get("/export/checkins", params={
+            "format": "ndjson", "since_id": records[1]["id"]}).text.splitlines()
+        assert [json.loads(line)["id"] for line in since_id] == [r["id"] for r in records[2:]]
+        since_date = client.get("/export/checkins", params={
+            "since_date": str(date.today() - timedelta(days=1))}).text.splitlines()
+        assert len(since_date) == 3
+
+    def test_large_exports_are_gzipped(self, client, clean_db):
+        """Test that clients accepting gzip get a compressed stream."""
+        add_history("zipped", range(200))
+        response = client.get("/export/checkins", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.text.splitlines()) == 201
+
+    def test_unknown_table(self, client):
+        """Test that only the exported tables can be requested."""
+        assert client.get("/export/xp_rollups").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/export/users?format=xml").status_code == 422
+
+    def test_chunks_to_gzip_file(self, clean_db, tmp_path):
+        """Test the CLI path: chunks of a few rows written to a gzip file."""
+        add_history("chunked", range(7))
+        path = str(tmp_path / "checkins.csv.gz")
+        with TestingSession() as db:
+            chunks = list(export_chunks(db, "checkins", chunk_size=3))
+            with open_output(path, compress=True) as out:
+                for chunk in chunks:
+                    out.write(chunk)
+
+        # Header, then 7 rows in chunks of 3
+        assert len(chunks) == 4
+        with gzip.open(path, "rt") as f:
+            assert len(f.read().splitlines()) == 8
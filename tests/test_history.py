@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from fastapi import status
+
+from models import User, CheckIn
+from streaks import summarize_days
+from tests.conftest import TestingSession
+
+
+def add_history(username, days_ago):
+    db = TestingSession()
+    try:
+        user = User(username=username, email=f"{username}@gmail.com")
+        db.add(user)
+        db.flush()
+        for offset in days_ago:
+            db.add(CheckIn(user_id=user.id, xp_earned=10,
+                           checkin_date=date.today() - timedelta(days=offset)))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+class TestSummarizeDays:
+
+    def test_longest_and_current_runs(self):
+        """Test run detection over ordinals."""
+        summary = summarize_days([1, 2, 3, 5, 6, 9, 10], today=10)
+        assert summary.longest_streak == 3
+        assert summary.current_streak == 2
+        assert summary.active_days == 7
+        assert (summary.first_day, summary.last_day) == (1, 10)
+
+    def test_lapsed_streak_is_zero(self):
+        """Test that a run ending before yesterday is not current."""
+        assert summarize_days([1, 2], today=4).current_streak == 0
+        assert summarize_days([1, 2], today=3).current_streak == 2
+
+    def test_no_days(self):
+        """Test an empty history."""
+        assert summarize_days([], today=10).active_days == 0
+
+
+class TestHistoryEndpoint:
+
+    def test_history_summarizes_checkins(self, client, clean_db):
+        """Test streaks and the default heatmap window."""
+        user_id = add_history("historian", [0, 1, 2, 5, 6, 7, 8, 400])
+
+        response = client.get(f"/users/{user_id}/history")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_checkins"] == 8
+        assert data["longest_streak"] == 4
+        assert data["current_streak"] == 3
+        assert data["first_checkin_date"] == str(date.today() - timedelta(days=400))
+        # The default heatmap covers the last 365 days
+        assert len(data["heatmap"]) == 7
+        assert data["heatmap"][str(date.today())] == 10
+
+    def test_heatmap_range(self, client, clean_db):
+        """Test an explicit heatmap window."""
+        user_id = add_history("ranged", [0, 1, 2, 3])
+        response = client.get(f"/users/{user_id}/history", params={
+            "start": str(date.today() - timedelta(days=2)),
+            "end": str(date.today() - timedelta(days=1))})
+        assert sorted(response.json()["heatmap"]) == [
+            str(date.today() - timedelta(days=2)), str(date.today() - timedelta(days=1))]
+
+    def test_user_without_checkins(self, client, clean_db):
+        """Test an existing user with no history and a missing user."""
+        user_id = add_history("newcomer", [])
+        data = client.get(f"/users/{user_id}/history").json()
+        assert data["total_checkins"] == 0
+        assert data["last_checkin_date"] is None
+
+        assert client.get("/users/9999/history").status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,72 @@
+from datetime import date
+
+from fastapi import status
+from sqlalchemy import event
+
+from cache import idempotency_cache
+from motivational import get_motivational_message
+from tests.conftest import engine
+
+
+class TestIdempotentCheckIn:
+
+    def test_retry_replays_the_first_response_without_queries(self, client, clean_db, create_user):
+        """Test that a retried check-in returns the stored body."""
+        user = create_user(client, "retrier")
+        headers = {"Idempotency-Key": "abc-123"}
+        first = client.post("/checkin/", json={"user_id": user["id"]}, headers=headers)
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            retry = client.post("/checkin/", json={"user_id": user["id"]}, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert first.status_code == retry.status_code == status.HTTP_200_OK
+        assert retry.content == first.content
+        assert retry.json()["total_xp"] == 10
+        assert statements == []
+
+    def test_new_key_still_hits_the_once_per_day_guard(self, client, clean_db, create_user):
+        """Test that keys do not bypass the daily limit."""
+        user = create_user(client, "newkey")
+        client.post("/checkin/", json={"user_id": user["id"]},
+                    headers={"Idempotency-Key": "one"})
+        response = client.post("/checkin/", json={"user_id": user["id"]},
+                               headers={"Idempotency-Key": "two"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_keys_are_scoped_to_the_user(self, client, clean_db, create_user):
+        """Test that two users may send the same key."""
+        first = create_user(client, "scopea")
+        second = create_user(client, "scopeb")
+        headers = {"Idempotency-Key": "shared"}
+        client.post("/checkin/", json={"user_id": first["id"]}, headers=headers)
+        response = client.post("/checkin/", json={"user_id": second["id"]}, headers=headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get(f"/users/{second['id']}").json()["total_xp"] == 10
+
+    def test_failures_are_not_stored(self, client, clean_db):
+        """Test that an error response can be retried."""
+        headers = {"Idempotency-Key": "missing"}
+        response = client.post("/checkin/", json={"user_id": 9999}, headers=headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert len(idempotency_cache) == 0
+
+
+class TestSeededMessages:
+
+    def test_same_seed_picks_the_same_message(self):
+        """Test that seeded selection is deterministic."""
+        seed = f"42:{date.today().isoformat()}"
+        messages = {get_motivational_message(5, seed=seed) for _ in range(20)}
+        assert len(messages) == 1
+        comebacks = {get_motivational_message(1, is_comeback=True, seed=seed) for _ in range(20)}
+        assert len(comebacks) == 1
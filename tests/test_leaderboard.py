@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+
+from fastapi import status
+from leaderboard import LeaderboardIndex
+from models import User
+from tests.conftest import TestingSession
+
+
+class TestLeaderboardIndex:
+
+    def test_ranks_by_xp_then_id(self):
+        """Test ordering and rank lookups on the index itself."""
+        index = LeaderboardIndex()
+        index.loaded = True
+        index.upsert(1, "alice", 10, 1)
+        index.upsert(2, "bob", 30, 3)
+        index.upsert(3, "carol", 10, 1)
+
+        assert [e.user_id for e in index.page(0, 10)] == [2, 1, 3]
+        assert index.rank_of(3) == 3
+
+        # Moving a user re-sorts without duplicating the entry
+        index.upsert(3, "carol", 50, 2)
+        assert [e.user_id for e in index.page(0, 10)] == [3, 2, 1]
+        assert [e.rank for e in index.page(1, 2)] == [2, 3]
+        assert len(index) == 3
+
+    def test_lapsed_streaks_read_as_zero(self):
+        """Test the index serves a streak as 0 once its last check-in is before yesterday."""
+        today = date.today()
+        index = LeaderboardIndex()
+        index.loaded = True
+        index.upsert(1, "alice", 10, 4, today - timedelta(days=1))
+        index.upsert(2, "bob", 30, 5, today - timedelta(days=2))
+
+        assert [e.current_streak for e in index.page(0, 10)] == [0, 4]
+        assert index.around(2, 1)[0].current_streak == 0
+
+    def test_reloads_after_writes_by_other_processes(self, clean_db, clock):
+        """Test the index picks up rows it was not told about once its TTL passes."""
+        index = LeaderboardIndex(ttl=30, clock=clock)
+        with TestingSession() as db:
+            index.ensure_loaded(db)
+            # Added by another worker, so upsert() never saw it
+            db.add(User(username="elsewhere", email="elsewhere@gmail.com", total_xp=40))
+            db.commit()
+
+            index.ensure_loaded(db)
+            assert len(index) == 0
+            clock.now = 30
+            index.ensure_loaded(db)
+            assert [e.username for e in index.page(0, 10)] == ["elsewhere"]
+
+            # Nothing it does not know about: the check does not reload, so the ETag stays put
+            index.upsert(1000, "local", 10, 1)
+            db.add(User(id=1000, username="local", email="local@gmail.com", total_xp=10))
+            db.commit()
+            version = index.version
+            clock.now = 60
+            index.ensure_loaded(db)
+            assert index.version == version
+
+    def test_upsert_before_load_is_ignored(self):
+        """Test that writes before the first load are left to the load."""
+        index = LeaderboardIndex()
+        index.upsert(1, "alice", 10, 1)
+        assert len(index) == 0
+
+
+class TestLeaderboardEndpoints:
+
+    def test_leaderboard_returns_ranked_entries(self, client, clean_db, create_user):
+        """Test ranks, pagination and incremental updates after check-in."""
+        users = [create_user(client, f"ranked{i}") for i in range(3)]
+        client.post("/checkin/", json={"user_id": users[2]["id"]})
+
+        response = client.get("/leaderboard/")
+        assert response.status_code == status.HTTP_200_OK
+        board = response.json()
+        assert [e["user_id"] for e in board] == [
+            users[2]["id"], users[0]["id"], users[1]["id"]]
+        assert [e["rank"] for e in board] == [1, 2, 3]
+        assert board[0]["total_xp"] == 10
+
+        page = client.get("/leaderboard/", params={"limit": 1, "offset": 1}).json()
+        assert [e["user_id"] for e in page] == [users[0]["id"]]
+
+    def test_user_rank_with_neighbours(self, client, clean_db, create_user):
+        """Test the rank of a user and the users around them."""
+        users = [create_user(client, f"neighbour{i}") for i in range(5)]
+
+        response = client.get(
+            f"/users/{users[2]['id']}/rank", params={"neighbours": 1})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["user"]["rank"] == 3
+        assert [e["user_id"] for e in data["above"]] == [users[1]["id"]]
+        assert [e["user_id"] for e in data["below"]] == [users[3]["id"]]
+        assert data["total_users"] == 5
+
+    def test_user_rank_for_unknown_user_returns_404(self, client, clean_db):
+        """Test rank lookup for a non-existent user."""
+        response = client.get("/users/9999/rank")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
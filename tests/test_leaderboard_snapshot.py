@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import time
+
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+import leaderboard_snapshot
+import main
+from benchmarks.seed import seed_database
+from leaderboard_snapshot import LeaderboardSnapshot, load_top_entries, refresh_from
+from models import User
+from schemas import LeaderboardEntry
+from tests.conftest import TestingSession
+
+
+def _entries(n):
+    return [LeaderboardEntry(rank=i + 1, user_id=i + 1, username=f"user{i}",
+                             total_xp=1000 - i, current_streak=i) for i in range(n)]
+
+
+def _worker(snapshot_path, db_path, start, results):
+    """One 'uvicorn worker': refresh the shared snapshot if needed, then read it."""
+    snapshot = LeaderboardSnapshot(snapshot_path, max_entries=20)
+    session_factory = sessionmaker(bind=create_engine(f"sqlite:///{db_path}"))
+    start.wait()
+    rebuilt = refresh_from(snapshot, session_factory)
+    while snapshot.is_dirty():
+        time.sleep(0.01)
+    page = snapshot.read(0, 10)
+    results.put(json.dumps({"rebuilt": rebuilt, "version": page[0],
+                            "body": page[1].decode(), "tail": snapshot.read(15, 5)[1].decode()}))
+    snapshot.close()
+
+
+class TestLeaderboardSnapshot:
+
+    def test_pages_are_slices_of_the_published_entries(self, tmp_path):
+        """Test reading any window inside the snapshot."""
+        snapshot = LeaderboardSnapshot(str(tmp_path / "lb"), max_entries=10)
+        assert snapshot.read(0, 5) is None
+        assert snapshot.refresh(lambda n: _entries(n))
+        assert not snapshot.refresh(lambda n: pytest.fail("clean snapshot rebuilt"))
+
+        version, body = snapshot.read(2, 3)
+        assert [entry["rank"] for entry in json.loads(body)] == [3, 4, 5]
+        assert snapshot.read(5, 10) is None  # may continue past the snapshot
+
+        snapshot.mark_dirty()
+        assert snapshot.refresh(lambda n: _entries(3))
+        assert snapshot.read(0, 10)[0] != version
+        # A table smaller than the snapshot is served whole
+        assert len(json.loads(snapshot.read(0, 10)[1])) == 3
+        assert json.loads(snapshot.read(5, 10)[1]) == []
+
+    def test_workers_share_one_rebuild(self, tmp_path):
+        """Test that several processes agree on the snapshot and only one builds it."""
+        db_path = str(tmp_path / "bench.db")
+        seed_database(db_path, users=40, checkins=200)
+        snapshot_path = str(tmp_path / "leaderboard")
+
+        def run_workers(count=4):
+            context = multiprocessing.get_context("spawn")
+            start, results = context.Event(), context.Queue()
+            workers = [context.Process(target=_worker, args=(snapshot_path, db_path, start, results))
+                       for _ in range(count)]
+            for worker in workers:
+                worker.start()
+            start.set()
+            outcomes = [json.loads(results.get(timeout=30)) for _ in workers]
+            for worker in workers:
+                worker.join(timeout=30)
+            return outcomes
+
+        first = run_workers()
+        assert sum(outcome["rebuilt"] for outcome in first) == 1
+        assert len({(o["version"], o["body"], o["tail"]) for o in first}) == 1
+
+        db_engine = create_engine(f"sqlite:///{db_path}")
+        with sessionmaker(bind=db_engine)() as db:
+            last = load_top_entries(db, 40)[-1]
+            db.execute(update(User).where(User.id == last.user_id)
+                       .values(total_xp=User.total_xp + 100_000))
+            db.commit()
+            expected = [entry.model_dump(mode="json") for entry in load_top_entries(db, 10)]
+        LeaderboardSnapshot(snapshot_path, max_entries=20).mark_dirty()
+
+        second = run_workers()
+        assert sum(outcome["rebuilt"] for outcome in second) == 1
+        assert len({(o["version"], o["body"]) for o in second}) == 1
+        assert second[0]["version"] != first[0]["version"]
+        assert json.loads(second[0]["body"]) == expected
+        assert expected[0]["user_id"] == last.user_id
+
+
+class TestSnapshotEndpoint:
+
+    def test_leaderboard_is_served_from_the_snapshot(self, client, clean_db, tmp_path, monkeypatch):
+        """Test the read path and dirty marking on check-in."""
+        snapshot = LeaderboardSnapshot(str(tmp_path / "lb"), max_entries=10)
+        monkeypatch.setattr(leaderboard_snapshot, "_snapshot", snapshot)
+        monkeypatch.setattr(main, "LEADERBOARD_SNAPSHOT_PATH", str(tmp_path / "lb"))
+        user = client.post("/users/", json={"username": "snap", "email": "snap@gmail.com"}).json()
+        refresh_from(snapshot, TestingSession)
+
+        response = client.get("/leaderboard/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] == f'W/"lbs-{snapshot.version}"'
+        assert response.json()[0]["user_id"] == user["id"]
+
+        client.post("/checkin/", json={"user_id": user["id"]})
+        assert snapshot.is_dirty()
+        refresh_from(snapshot, TestingSession)
+        assert client.get("/leaderboard/").json()[0]["total_xp"] == 10
@@ -0,0 +1,143 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import IntegrityError
+
+from maintenance import migrate, recompute_streaks
+from models import User, CheckIn, XpRollup
+from tests.conftest import TestingSession
+
+# Schema of databases created before the check-in constraint and indexes
+PRE_SERIES_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR(50) NOT NULL, email VARCHAR NOT NULL,
+    total_xp INTEGER, current_streak INTEGER, last_check_in_date DATE, PRIMARY KEY (id));
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE checkins (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, checkin_date DATE NOT NULL,
+    xp_earned INTEGER, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE INDEX ix_checkins_id ON checkins (id);
+"""
+
+
+def create_pre_series_database(db_path):
+    """An old database whose user 1 checked in three times on one day."""
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(PRE_SERIES_SCHEMA)
+        conn.execute("INSERT INTO users VALUES (1, 'veteran', 'veteran@gmail.com', 40, 2, "
+                     "'2025-06-16')")
+        conn.executemany(
+            "INSERT INTO checkins (user_id, checkin_date, xp_earned) VALUES (1, ?, 10)",
+            [("2025-06-15",), ("2025-06-15",), ("2025-06-15",), ("2025-06-16",)])
+    conn.close()
+
+
+def add_user_with_checkins(username, days, **fields):
+    db = TestingSession()
+    try:
+        user = User(username=username, email=f"{username}@gmail.com", **fields)
+        db.add(user)
+        db.flush()
+        for day in days:
+            db.add(CheckIn(user_id=user.id, xp_earned=10, checkin_date=day))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+class TestRecompute:
+
+    def test_recompute_rebuilds_counters_from_checkins(self, clean_db):
+        """Test a streak crossing a month boundary with a milestone."""
+        start = date(2025, 1, 26)
+        days = [start + timedelta(days=i) for i in range(7)]
+        user_id = add_user_with_checkins(
+            "recomputed", days, current_streak=1, total_xp=5,
+            last_check_in_date=days[-1])
+        lapsed_id = add_user_with_checkins(
+            "lapsed", [date(2025, 1, 1), date(2025, 1, 3)], current_streak=2, total_xp=20,
+            last_check_in_date=date(2025, 1, 3))
+        idle_id = add_user_with_checkins("idle", [], current_streak=0, total_xp=0)
+
+        progress = []
+        result = recompute_streaks(
+            TestingSession, chunk_size=2, progress=lambda done, total: progress.append(done),
+            today=days[-1] + timedelta(days=1))
+
+        assert progress == [2, 3]
+        assert (result.users, result.checkins) == (3, 9)
+        assert result.users_updated == 2
+        assert result.checkins_updated == 1
+
+        db = TestingSession()
+        try:
+            user = db.get(User, user_id)
+            assert user.current_streak == 7
+            assert user.total_xp == 7 * 10 + 50
+            assert user.last_check_in_date == days[-1]
+            seventh = db.query(CheckIn).filter(
+                CheckIn.user_id == user_id, CheckIn.checkin_date == days[-1]).one()
+            assert seventh.xp_earned == 60
+            # The rollups follow the rewritten XP; Jan 26 is the Sunday before the week turns
+            rollups = {(r.period, r.period_start): r.xp for r in db.query(XpRollup).filter(
+                XpRollup.user_id == user_id)}
+            assert rollups == {("week", date(2025, 1, 20)): 10, ("week", date(2025, 1, 27)): 110,
+                               ("month", date(2025, 1, 1)): 60, ("month", date(2025, 2, 1)): 60}
+
+            lapsed = db.get(User, lapsed_id)
+            # The lapsed user's last run ended weeks before, so no streak is left
+            assert (lapsed.current_streak, lapsed.total_xp) == (0, 20)
+            assert db.get(User, idle_id).total_xp == 0
+        finally:
+            db.close()
+
+    def test_recompute_is_idempotent(self, clean_db):
+        """Test that a second run rewrites nothing."""
+        add_user_with_checkins("steady", [date(2025, 5, 1), date(2025, 5, 2)])
+        recompute_streaks(TestingSession, progress=None)
+        result = recompute_streaks(TestingSession, progress=None)
+        assert (result.users_updated, result.checkins_updated) == (0, 0)
+
+
+class TestMigrate:
+
+    def test_migrate_upgrades_a_pre_series_database(self, tmp_path):
+        """Test duplicates are removed and the constraint and indexes are added."""
+        db_path = str(tmp_path / "old.db")
+        create_pre_series_database(db_path)
+        db_engine = create_engine(f"sqlite:///{db_path}")
+
+        migrate(db_engine)
+        migrate(db_engine)
+
+        inspector = inspect(db_engine)
+        indexes = {index["name"]: index for index in inspector.get_indexes("checkins")}
+        assert indexes["uq_checkins_user_date"]["unique"]
+        assert {"ix_users_total_xp", "ix_users_last_check_in_date"} <= {
+            index["name"] for index in inspector.get_indexes("users")}
+        assert "xp_rollups" in inspector.get_table_names()
+        with db_engine.begin() as conn:
+            days = conn.exec_driver_sql(
+                "SELECT id, checkin_date FROM checkins ORDER BY id").all()
+            assert days == [(1, "2025-06-15"), (4, "2025-06-16")]
+            # Rollups were backfilled from the remaining check-ins
+            assert conn.exec_driver_sql(
+                "SELECT period, period_start, checkins FROM xp_rollups ORDER BY 1, 2").all() == [
+                ("month", "2025-06-01", 2), ("week", "2025-06-09", 1), ("week", "2025-06-16", 1)]
+            with pytest.raises(IntegrityError):
+                conn.exec_driver_sql("INSERT INTO checkins (user_id, checkin_date, xp_earned) "
+                                     "VALUES (1, '2025-06-16', 10)")
+        db_engine.dispose()
+
+    def test_migrate_adds_no_duplicate_index_to_new_databases(self, tmp_path):
+        """Test a fresh schema keeps only its inline unique constraint."""
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+        migrate(db_engine)
+        names = {index["name"] for index in inspect(db_engine).get_indexes("checkins")}
+        assert "uq_checkins_user_date" not in names
+        db_engine.dispose()
@@ -0,0 +1,70 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from metrics import MetricsMiddleware, MetricsRegistry, request_queries, requests_total
+from tests.conftest import engine
+
+
+class TestMetricsRegistry:
+
+    def test_prometheus_text_format(self):
+        """Test counter, histogram and gauge rendering."""
+        registry = MetricsRegistry()
+        counter = registry.counter("things_total", "Things")
+        histogram = registry.histogram("wait_seconds", "Waits", buckets=(0.1, 1.0))
+        registry.gauge("depth", "Depth", lambda: 3)
+
+        counter.inc(route="/a")
+        counter.inc(2, route="/a")
+        histogram.observe(0.5, route="/a")
+
+        lines = registry.render().splitlines()
+        assert 'things_total{route="/a"} 3' in lines
+        assert 'wait_seconds_bucket{route="/a",le="0.1"} 0' in lines
+        assert 'wait_seconds_bucket{route="/a",le="1.0"} 1' in lines
+        assert 'wait_seconds_bucket{route="/a",le="+Inf"} 1' in lines
+        assert 'wait_seconds_count{route="/a"} 1' in lines
+        assert "depth 3" in lines
+
+
+class TestRequestMetrics:
+
+    def test_requests_are_recorded_by_route_template(self, client, clean_db):
+        """Test status counts and SQL statement counts per route."""
+        user = client.post(
+            "/users/", json={"username": "measured", "email": "measured@gmail.com"}).json()
+        before = requests_total.value(method="GET", route="/users/{user_id}", status="404")
+        checkins = request_queries.count(method="POST", route="/checkin/")
+
+        client.get("/users/9999")
+        client.post("/checkin/", json={"user_id": user["id"]})
+
+        assert requests_total.value(
+            method="GET", route="/users/{user_id}", status="404") == before + 1
+        assert request_queries.count(method="POST", route="/checkin/") == checkins + 1
+
+        body = client.get("/metrics").text
+        assert 'http_requests_total{method="POST",route="/checkin/",status="200"}' in body
+        assert "http_request_db_seconds_total" in body
+        assert "user_cache_hits" in body
+
+    def test_slow_requests_are_logged_with_their_sql(self, caplog):
+        """Test the slow-request trace."""
+        slow_app = FastAPI()
+        slow_app.add_middleware(MetricsMiddleware, slow_request_ms=0.0001)
+
+        @slow_app.get("/slow")
+        def slow():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return {}
+
+        with caplog.at_level(logging.WARNING, logger="daily_streak.metrics"):
+            TestClient(slow_app).get("/slow")
+
+        assert "slow request GET /slow -> 200" in caplog.text
+        assert "(1 queries" in caplog.text
+        assert "SELECT 1" in caplog.text
@@ -0,0 +1,64 @@
+import pytest
+
+from cache import user_cache
+from leaderboard import reset_leaderboard_indexes
+
+
+def cold():
+    """Drop the in-memory state so a request pays for its own reads."""
+    user_cache.clear()
+    reset_leaderboard_indexes()
+
+
+class TestQueryBudgets:
+
+    def test_user_endpoints(self, client, clean_db, query_budget, create_user):
+        """Test creating, listing and reading users."""
+        with query_budget("POST /users/"):
+            user = create_user(client, "budgeted")
+        with query_budget("GET /users/"):
+            assert client.get("/users/").status_code == 200
+
+        client.post("/checkin/", json={"user_id": user["id"]})
+
+        cold()
+        with query_budget("GET /users/{id}"):
+            assert client.get(f"/users/{user['id']}").status_code == 200
+        with query_budget("GET /users/{id}/history"):
+            assert client.get(f"/users/{user['id']}/history").status_code == 200
+        cold()
+        with query_budget("GET /users/{id}/rank"):
+            assert client.get(f"/users/{user['id']}/rank").status_code == 200
+
+    def test_check_in_endpoints(self, client, clean_db, query_budget, create_user):
+        """Test single, repeated and batch check-ins."""
+        first = create_user(client, "budgetone")
+        second = create_user(client, "budgettwo")
+        cold()
+        with query_budget("POST /checkin/"):
+            assert client.post("/checkin/", json={"user_id": first["id"]}).status_code == 200
+        with query_budget("POST /checkin/ (repeat)"):
+            assert client.post("/checkin/", json={"user_id": first["id"]}).status_code == 400
+        with query_budget("POST /checkin/batch"):
+            assert client.post("/checkin/batch", json={
+                "user_ids": [first["id"], second["id"]]}).status_code == 200
+
+    def test_leaderboard_endpoints(self, client, clean_db, query_budget, create_user):
+        """Test the all-time board, cold then warm, and a period board."""
+        create_user(client, "budgetboard")
+        cold()
+        with query_budget("GET /leaderboard/"):
+            assert client.get("/leaderboard/").status_code == 200
+        with query_budget(max_statements=0):
+            assert client.get("/leaderboard/").status_code == 200
+        with query_budget("GET /leaderboard/?period=week"):
+            assert client.get("/leaderboard/?period=week").status_code == 200
+
+    def test_over_budget_lists_statements(self, client, clean_db, query_budget):
+        """Test the failure report."""
+        with pytest.raises(pytest.fail.Exception) as failure:
+            with query_budget("GET /users/", max_statements=0):
+                client.get("/users/")
+        message = str(failure.value)
+        assert "GET /users/ over its query budget: 1 statements (budget 0)" in message
+        assert "1.  " in message and "SELECT users.id" in message
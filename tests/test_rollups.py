@@ -0,0 +1,106 @@
+from datetime import date
+
+from sqlalchemy import select
+
+import main
+from maintenance import backfill_rollups
+from models import User, CheckIn, XpRollup
+from rollups import period_start, top_entries
+from tests.conftest import TestingSession
+from write_behind import stop_check_in_writers
+
+
+def rollups_of(user_id):
+    with TestingSession() as db:
+        return {(row.period, row.period_start): (row.xp, row.checkins)
+                for row in db.scalars(select(XpRollup).where(XpRollup.user_id == user_id))}
+
+
+class TestRollups:
+
+    def test_period_start(self):
+        """Test ISO week and calendar month boundaries."""
+        # 2025-03-02 is a Sunday, so its week started in February
+        assert period_start("week", date(2025, 3, 2)) == date(2025, 2, 24)
+        assert period_start("week", date(2025, 3, 3)) == date(2025, 3, 3)
+        assert period_start("month", date(2025, 3, 2)) == date(2025, 3, 1)
+
+    def test_check_ins_update_rollups(self, client, clean_db, create_user):
+        """Test single and batch check-ins adding to this week and month."""
+        today = date.today()
+        single = create_user(client, "rollsingle")
+        batched = create_user(client, "rollbatch")
+        assert client.post("/checkin/", json={"user_id": single["id"]}).status_code == 200
+        assert client.post("/checkin/batch", json={"user_ids": [batched["id"]]}).status_code == 200
+
+        for user in (single, batched):
+            assert rollups_of(user["id"]) == {
+                ("week", period_start("week", today)): (10, 1),
+                ("month", period_start("month", today)): (10, 1)}
+
+    def test_period_leaderboard_ranks_by_period_xp(self, client, clean_db, create_user):
+        """Test that a big all-time total does not lead this week's board."""
+        today = date.today()
+        veteran = create_user(client, "veteran")
+        newcomer = create_user(client, "newcomer")
+        with TestingSession() as db:
+            db.get(User, veteran["id"]).total_xp = 1000
+            db.commit()
+        client.post("/checkin/", json={"user_id": newcomer["id"]})
+        with TestingSession() as db:
+            db.add(XpRollup(period="week", period_start=period_start("week", today),
+                            user_id=veteran["id"], xp=5, checkins=1))
+            db.commit()
+
+        board = client.get("/leaderboard/?period=week").json()
+        assert [(e["user_id"], e["rank"], e["total_xp"]) for e in board] == [
+            (newcomer["id"], 1, 10), (veteran["id"], 2, 5)]
+        assert client.get("/leaderboard/?period=week&offset=1").json()[0]["rank"] == 2
+        assert [e["user_id"] for e in client.get("/leaderboard/?period=month").json()] == [
+            newcomer["id"]]
+        assert client.get("/leaderboard/").json()[0]["user_id"] == veteran["id"]
+
+    def test_unknown_period_is_rejected(self, client):
+        """Test period validation."""
+        response = client.get("/leaderboard/?period=year")
+        assert response.status_code == 422
+
+    def test_write_behind_check_ins_update_rollups(
+            self, client, clean_db, monkeypatch, create_user):
+        """Test that group-committed check-ins reach the rollups."""
+        user = create_user(client, "rollqueued")
+        monkeypatch.setattr(main, "WRITE_BEHIND", True)
+        try:
+            assert client.post("/checkin/", json={"user_id": user["id"]}).status_code == 200
+        finally:
+            stop_check_in_writers()
+
+        with TestingSession() as db:
+            assert top_entries(db, "week", date.today())[0].user_id == user["id"]
+
+    def test_backfill_rebuilds_rollups_from_checkins(self, clean_db):
+        """Test the backfill over existing history, replacing stale rows."""
+        with TestingSession() as db:
+            user = User(username="backfilled", email="backfilled@gmail.com")
+            db.add(user)
+            db.flush()
+            # Sunday, then Monday of the next week, both in March
+            for day, xp in ((date(2025, 3, 2), 10), (date(2025, 3, 3), 15)):
+                db.add(CheckIn(user_id=user.id, xp_earned=xp, checkin_date=day))
+            db.add(XpRollup(period="week", period_start=date(2025, 3, 3),
+                            user_id=user.id, xp=999, checkins=9))
+            db.commit()
+            user_id = user.id
+
+        progress = []
+        written = backfill_rollups(
+            TestingSession, chunk_size=1, progress=lambda done, total: progress.append(done))
+
+        assert (written, progress) == (3, [1])
+        assert rollups_of(user_id) == {
+            ("week", date(2025, 2, 24)): (10, 1),
+            ("week", date(2025, 3, 3)): (15, 1),
+            ("month", date(2025, 3, 1)): (25, 2)}
+        # Rerunning leaves the same rows
+        backfill_rollups(TestingSession, progress=None)
+        assert len(rollups_of(user_id)) == 3
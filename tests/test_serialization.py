@@ -0,0 +1,66 @@
+from datetime import date
+
+import pytest
+from fastapi import status
+
+import main
+
+
+@pytest.fixture
+def users(client, clean_db):
+    created = [client.post("/users/", json={
+        "username": f"fast{i}", "email": f"fast{i}@gmail.com"}).json() for i in range(5)]
+    client.post("/checkin/", json={"user_id": created[0]["id"]})
+    return created
+
+
+class TestLastCheckinDate:
+
+    def test_user_reads_report_the_last_check_in(self, client, users):
+        """Test that last_checkin_date is read from last_check_in_date."""
+        today = date.today().isoformat()
+
+        assert client.get(f"/users/{users[0]['id']}").json()["last_checkin_date"] == today
+        listed = client.get("/users/", params={"limit": 5}).json()
+        assert listed[0]["last_checkin_date"] == today
+        assert listed[1]["last_checkin_date"] is None
+
+
+class TestFastJson:
+
+    def test_user_pages_match_the_validated_path(self, client, users, monkeypatch):
+        """Test that the orjson path returns the same body and cursor."""
+        params = {"limit": 3}
+        slow = client.get("/users/", params=params)
+        monkeypatch.setattr(main, "FAST_JSON", True)
+        fast = client.get("/users/", params=params)
+        by_ids = client.get("/users/", params={"ids": f"{users[1]['id']},{users[0]['id']}"})
+
+        assert fast.status_code == status.HTTP_200_OK
+        assert fast.json() == slow.json()
+        assert fast.headers["X-Next-Cursor"] == slow.headers["X-Next-Cursor"]
+        assert [user["id"] for user in by_ids.json()] == [users[0]["id"], users[1]["id"]]
+
+    def test_leaderboard_matches_the_validated_path(self, client, users, monkeypatch):
+        """Test that the orjson leaderboard keeps its body and ETag."""
+        slow = client.get("/leaderboard/")
+        monkeypatch.setattr(main, "FAST_JSON", True)
+        fast = client.get("/leaderboard/")
+
+        assert fast.json() == slow.json()
+        assert fast.headers["ETag"] == slow.headers["ETag"]
+        assert fast.headers["Cache-Control"] == slow.headers["Cache-Control"]
+
+
+class TestCompression:
+
+    def test_large_lists_are_gzipped(self, client, users):
+        """Test that big payloads are compressed and small ones are not."""
+        for i in range(5, 20):
+            client.post("/users/", json={"username": f"fast{i}", "email": f"fast{i}@gmail.com"})
+        large = client.get("/users/", headers={"Accept-Encoding": "gzip"})
+        small = client.get(f"/users/{users[0]['id']}", headers={"Accept-Encoding": "gzip"})
+
+        assert len(large.content) >= main.GZIP_MIN_SIZE
+        assert large.headers["Content-Encoding"] == "gzip"
+        assert "Content-Encoding" not in small.headers
@@ -0,0 +1,219 @@
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from main import async_router, get_shard_set, sharded_router, sync_router
+from models import User, CheckIn, XpRollup
+from shards import ShardSet, merge_sorted, rebalance
+
+
+def shard_url_list(tmp_path, name, count):
+    return [f"sqlite:///{tmp_path / f'{name}-{shard}.db'}" for shard in range(count)]
+
+
+def sharded_client(shard_set):
+    sharded_app = FastAPI()
+    sharded_app.include_router(sharded_router)
+    sharded_app.dependency_overrides[get_shard_set] = lambda: shard_set
+    return TestClient(sharded_app)
+
+
+@pytest.fixture
+def shard_set(tmp_path):
+    shard_set = ShardSet(shard_url_list(tmp_path, "shard", 3))
+    shard_set.migrate()
+    yield shard_set
+    shard_set.close()
+
+
+@pytest.fixture
+def client(shard_set, clean_db):
+    with sharded_client(shard_set) as client:
+        yield client
+
+
+def create_users(client, count, prefix="user"):
+    users = []
+    for number in range(count):
+        response = client.post("/users/", json={"username": f"{prefix}{number}",
+                                                "email": f"{prefix}{number}@gmail.com"})
+        assert response.status_code == status.HTTP_200_OK
+        users.append(response.json())
+    return users
+
+
+def user_counts(shard_set):
+    return shard_set.scatter(lambda db: db.scalar(select(func.count()).select_from(User)))
+
+
+class TestShardRouting:
+
+    def test_user_ids_match_their_shard(self, client, shard_set):
+        """Test new users get ids congruent to the shard they are stored on."""
+        users = create_users(client, 12)
+
+        assert len({user["id"] for user in users}) == 12
+        assert sum(user_counts(shard_set)) == 12
+        for user in users:
+            with shard_set.session_for(user["id"]) as db:
+                assert db.get(User, user["id"]).username == user["username"]
+
+    def test_duplicate_email_on_another_shard_is_rejected(self, client, shard_set):
+        """Test emails stay unique although users live on different shards."""
+        user = create_users(client, 1)[0]
+        # Pick a username that hashes to another shard than the first user's
+        username = next(name for name in (f"other{n}" for n in range(50))
+                        if shard_set.shard_for_username(name) != shard_set.shard_of(user["id"]))
+
+        response = client.post("/users/", json={"username": username, "email": user["email"]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Email already registered"
+
+    def test_check_in_writes_only_the_users_shard(self, client, shard_set):
+        """Test a check-in lands on its user's shard and the profile reflects it."""
+        user = create_users(client, 1)[0]
+
+        response = client.post("/checkin/", json={"user_id": user["id"]})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_xp"] == 10
+
+        checkins = shard_set.scatter(
+            lambda db: db.scalar(select(func.count()).select_from(CheckIn)))
+        assert checkins[shard_set.shard_of(user["id"])] == 1
+        assert sum(checkins) == 1
+        assert client.get(f"/users/{user['id']}").json()["total_xp"] == 10
+        assert client.get(f"/users/{user['id']}/history").json()["total_checkins"] == 1
+
+    def test_batch_results_keep_request_order(self, client):
+        """Test a batch spanning shards answers in the order the ids were sent."""
+        users = create_users(client, 6)
+        user_ids = [user["id"] for user in reversed(users)] + [999999, users[0]["id"]]
+
+        response = client.post("/checkin/batch", json={"user_ids": user_ids})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+        assert [result["user_id"] for result in results] == user_ids
+        assert [result["status_code"] for result in results] == [200] * 6 + [404, 400]
+
+    def test_routes_document_the_same_parameters(self):
+        """Test the OpenAPI parameters do not depend on DB_MODE or SHARDS."""
+        def parameters(router):
+            router_app = FastAPI()
+            router_app.include_router(router)
+            return {(path, method): operation.get("parameters", [])
+                    for path, operations in router_app.openapi()["paths"].items()
+                    for method, operation in operations.items()}
+
+        sync = parameters(sync_router)
+        for router in (async_router, sharded_router):
+            for route, documented in parameters(router).items():
+                assert documented == sync[route], route
+
+    def test_import_is_not_available(self, client):
+        """Test bulk import points to the rebalance tool instead."""
+        response = client.post("/users/import", content=b"",
+                               headers={"Content-Type": "text/csv"})
+        assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+
+class TestScatterGather:
+
+    def test_users_pages_merge_in_id_order(self, client):
+        """Test keyset pages over all shards are in id order and complete."""
+        created = sorted(user["id"] for user in create_users(client, 10))
+
+        first = client.get("/users/", params={"limit": 4})
+        second = client.get("/users/", params={"limit": 4,
+                                               "cursor": first.headers["X-Next-Cursor"]})
+        rest = client.get("/users/", params={"limit": 4,
+                                             "cursor": second.headers["X-Next-Cursor"]})
+        ids = [user["id"] for page in (first, second, rest) for user in page.json()]
+        assert ids == created
+        assert "X-Next-Cursor" not in rest.headers
+
+        lines = client.get("/users/", params={"format": "ndjson"}).text.splitlines()
+        assert len(lines) == 10
+        picked = client.get("/users/", params={"ids": f"{created[7]},{created[2]}"}).json()
+        assert [user["id"] for user in picked] == [created[2], created[7]]
+
+    def test_leaderboard_merges_shards(self, client):
+        """Test leaderboard pages and ranks are global, not per shard."""
+        users = create_users(client, 6)
+        # Two check-ins' worth of XP for some users via the batch endpoint
+        client.post("/checkin/batch", json={"user_ids": [user["id"] for user in users[:3]]})
+
+        board = client.get("/leaderboard/", params={"limit": 10}).json()
+        assert [entry["rank"] for entry in board] == list(range(1, 7))
+        assert [entry["total_xp"] for entry in board] == [10, 10, 10, 0, 0, 0]
+        keys = [(-entry["total_xp"], entry["user_id"]) for entry in board]
+        assert keys == sorted(keys)
+
+        page = client.get("/leaderboard/", params={"limit": 2, "offset": 2}).json()
+        assert page == board[2:4]
+        weekly = client.get("/leaderboard/", params={"period": "week"}).json()
+        assert [entry["user_id"] for entry in weekly] == [entry["user_id"] for entry in board[:3]]
+
+        etag = client.get("/leaderboard/").headers["ETag"]
+        assert client.get("/leaderboard/", headers={"If-None-Match": etag}).status_code == 304
+
+        middle = board[3]
+        rank = client.get(f"/users/{middle['user_id']}/rank", params={"neighbours": 2}).json()
+        assert rank["user"]["rank"] == 4
+        assert rank["above"] == board[1:3]
+        assert rank["below"] == board[4:6]
+        assert rank["total_users"] == 6
+
+    def test_export_merges_shards(self, client):
+        """Test the users export covers every shard, in id order."""
+        created = sorted(user["id"] for user in create_users(client, 5))
+
+        lines = client.get("/export/users").text.splitlines()
+        assert lines[0].startswith("id,")
+        assert [int(line.split(",")[0]) for line in lines[1:]] == created
+        response = client.get("/export/checkins", params={"since_id": 1})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_merge_sorted_slices_after_merging(self):
+        """Test the k-way merge applies offset and limit to the merged order."""
+        merged = merge_sorted([[1, 4, 7], [2, 5], [3, 6, 8]], key=lambda n: n,
+                              offset=2, limit=4)
+        assert list(merged) == [3, 4, 5, 6]
+
+
+class TestRebalance:
+
+    def test_rebalance_moves_every_row(self, client, shard_set, tmp_path):
+        """Test moving from 3 to 2 shards keeps users, check-ins and rollups."""
+        users = create_users(client, 8)
+        client.post("/checkin/batch", json={"user_ids": [user["id"] for user in users]})
+
+        target_urls = shard_url_list(tmp_path, "target", 2)
+        copied = rebalance(shard_set.urls, target_urls)
+        assert copied["users"] == 8
+        assert copied["checkins"] == 8
+        assert copied["xp_rollups"] == 16
+
+        targets = ShardSet(target_urls)
+        try:
+            for user in users:
+                with targets.session_for(user["id"]) as db:
+                    assert db.get(User, user["id"]).total_xp == 10
+                    assert db.scalar(select(func.count()).select_from(XpRollup)
+                                     .where(XpRollup.user_id == user["id"])) == 2
+            # New users keep getting ids congruent to their new shard
+            with sharded_client(targets) as moved:
+                user = create_users(moved, 1, prefix="after")[0]
+                assert user["id"] not in {existing["id"] for existing in users}
+                assert moved.get(f"/users/{user['id']}").status_code == status.HTTP_200_OK
+                # Moved users are on shard id % 2, not where their username hashes
+                for existing in users:
+                    response = moved.post("/users/", json={
+                        "username": existing["username"], "email": f"new-{existing['email']}"})
+                    assert response.status_code == status.HTTP_400_BAD_REQUEST
+                    assert response.json()["detail"] == "Username already taken"
+        finally:
+            targets.close()
+
+        with pytest.raises(ValueError):
+            rebalance(shard_set.urls, target_urls)
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from maintenance import migrate
+from tests.test_maintenance import create_pre_series_database
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code: str, db_path: str, startup_mode: str) -> None:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", STARTUP_MODE=startup_mode)
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, check=True)
+
+
+# Boots the app and exercises a check-in and the rollup-backed leaderboard
+CHECK_IN_SCRIPT = """
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    user = client.post("/users/", json={"username": "lazybones", "email": "lazy@gmail.com"})
+    assert user.status_code == 200, user.text
+    checkin = client.post("/checkin/", json={"user_id": user.json()["id"]})
+    assert checkin.status_code == 200, checkin.text
+    board = client.get("/leaderboard/", params={"period": "week"})
+    assert board.status_code == 200 and board.json()[0]["user_id"] == user.json()["id"], board.text
+"""
+
+
+def _tables(db_path: str):
+    return set(inspect(create_engine(f"sqlite:///{db_path}")).get_table_names())
+
+
+class TestStartup:
+
+    def test_importing_main_does_not_touch_the_schema(self, tmp_path):
+        """Test that importing the app has no database side effects."""
+        db_path = str(tmp_path / "cold.db")
+        _run("import main", db_path, "warm")
+        assert _tables(db_path) == set()
+
+    def test_warm_startup_creates_tables(self, tmp_path):
+        """Test that the lifespan migrates in the default mode."""
+        db_path = str(tmp_path / "warm.db")
+        _run("from fastapi.testclient import TestClient\nimport main\n"
+             "with TestClient(main.app): pass", db_path, "warm")
+        assert {"users", "checkins"} <= _tables(db_path)
+
+    def test_lazy_startup_leaves_the_schema_to_migrate(self, tmp_path):
+        """Test that lazy mode skips migration, and that migrate creates the tables."""
+        db_path = str(tmp_path / "lazy.db")
+        _run("from fastapi.testclient import TestClient\nimport main\n"
+             "with TestClient(main.app): pass", db_path, "lazy")
+        assert _tables(db_path) == set()
+
+        migrate(create_engine(f"sqlite:///{db_path}"))
+        assert {"users", "checkins"} <= _tables(db_path)
+
+    @pytest.mark.parametrize("existing", [False, True], ids=["fresh", "pre-series"])
+    def test_lazy_startup_migrates_on_first_request(self, tmp_path, existing):
+        """Test a lazy boot can check in against a new or an old database."""
+        db_path = str(tmp_path / "lazy.db")
+        if existing:
+            create_pre_series_database(db_path)
+        _run(CHECK_IN_SCRIPT, db_path, "lazy")
+        assert {"users", "checkins", "xp_rollups", "checkin_bitmaps"} <= _tables(db_path)
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+from main import _run_streak_sweep
+from maintenance import sweep_expired_streaks
+from models import User
+from tests.conftest import TestingSession
+
+
+def add_user(username, streak, days_ago):
+    db = TestingSession()
+    try:
+        user = User(username=username, email=f"{username}@gmail.com", total_xp=streak * 10,
+                    current_streak=streak,
+                    last_check_in_date=date.today() - timedelta(days=days_ago))
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+class TestStreakSweep:
+
+    def test_sweep_resets_only_lapsed_streaks(self, client, clean_db):
+        """Test which users the sweep touches and that reads agree with it."""
+        lapsed = add_user("sweptaway", streak=5, days_ago=2)
+        yesterday = add_user("yesterday", streak=3, days_ago=1)
+        today = add_user("today", streak=4, days_ago=0)
+
+        db = TestingSession()
+        try:
+            result = _run_streak_sweep(db)
+        finally:
+            db.close()
+        assert result.rows == 1
+        assert result.user_ids == [lapsed]
+
+        assert client.get(f"/users/{lapsed}").json()["current_streak"] == 0
+        streaks = {e["user_id"]: e["current_streak"]
+                   for e in client.get("/leaderboard/").json()}
+        assert streaks == {lapsed: 0, yesterday: 3, today: 4}
+
+    def test_reads_do_not_wait_for_the_sweep(self, client, clean_db):
+        """Test cached copies serve a lapsed streak as 0 whoever sweeps, e.g. the CLI."""
+        lapsed = add_user("outofband", streak=5, days_ago=2)
+        # Warm the user cache and the leaderboard index first
+        assert client.get(f"/users/{lapsed}").json()["current_streak"] == 0
+        client.get("/leaderboard/")
+
+        db = TestingSession()
+        try:
+            # What `python maintenance.py sweep` runs, with no in-process follow-up
+            assert sweep_expired_streaks(db).user_ids == [lapsed]
+        finally:
+            db.close()
+
+        assert client.get(f"/users/{lapsed}").json()["current_streak"] == 0
+        assert client.get(f"/users/{lapsed}/rank").json()["user"]["current_streak"] == 0
+        assert client.get("/leaderboard/").json()[0]["current_streak"] == 0
+
+    def test_second_sweep_touches_nothing(self, clean_db):
+        """Test that already reset streaks are skipped."""
+        add_user("once", streak=2, days_ago=10)
+        db = TestingSession()
+        try:
+            assert _run_streak_sweep(db).rows == 1
+            assert _run_streak_sweep(db).rows == 0
+        finally:
+            db.close()
@@ -0,0 +1,84 @@
+from fastapi import status
+from sqlalchemy import event
+
+from cache import LRUTTLCache, user_cache
+from tests.conftest import engine
+
+
+class TestLRUTTLCache:
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the size bound."""
+        cache = LRUTTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire_after_ttl(self, clock):
+        """Test the age bound."""
+        cache = LRUTTLCache(maxsize=10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        clock.now = 4.9
+        assert cache.get("a") == 1
+        clock.now = 5.0
+        assert cache.get("a") is None
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+    def test_update_only_touches_cached_entries(self):
+        """Test in-place updates without counting lookups."""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.update("a", lambda value: value + 1)
+        cache.update("b", lambda value: value + 1)
+
+        assert cache.get("a") == 2
+        assert "b" not in cache._data
+        assert cache.stats()["hits"] == 1
+
+
+class TestUserCache:
+
+    def test_repeated_user_reads_skip_the_database(self, client, clean_db):
+        """Test that a cached profile is served without a query."""
+        user = client.post(
+            "/users/", json={"username": "cached", "email": "cached@gmail.com"}).json()
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            response = client.get(f"/users/{user['id']}")
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == "cached"
+        assert statements == []
+
+    def test_check_in_updates_the_cached_user(self, client, clean_db):
+        """Test write-through on check-in."""
+        user = client.post(
+            "/users/", json={"username": "cachedstreak", "email": "cs@gmail.com"}).json()
+        client.get(f"/users/{user['id']}")
+        client.post("/checkin/", json={"user_id": user["id"]})
+
+        data = client.get(f"/users/{user['id']}").json()
+        assert data["total_xp"] == 10
+        assert data["current_streak"] == 1
+
+    def test_unknown_user_is_not_cached(self, client, clean_db):
+        """Test that 404s are not cached."""
+        misses = user_cache.stats()["misses"]
+        assert client.get("/users/9999").status_code == status.HTTP_404_NOT_FOUND
+        assert client.get("/users/9999").status_code == status.HTTP_404_NOT_FOUND
+        assert user_cache.stats()["misses"] == misses + 2
@@ -0,0 +1,62 @@
+from fastapi import status
+
+import user_import
+
+
+class TestUserImport:
+
+    def test_csv_import_reports_duplicates_per_row(self, client, clean_db):
+        """Test a CSV import against existing and repeated users."""
+        client.post("/users/", json={"username": "existing", "email": "existing@gmail.com"})
+        body = (
+            "username,email\n"
+            "csvone,csvone@gmail.com\n"
+            "existing,other@gmail.com\n"
+            "csvtwo,csvtwo@gmail.com\n"
+            "x,not-an-email\n"
+            "csvtwo,csvtwo@gmail.com\n"
+        )
+
+        response = client.post(
+            "/users/import", content=body, headers={"Content-Type": "text/csv"})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert (data["received"], data["inserted"], data["failed"]) == (5, 2, 3)
+        assert [error["line"] for error in data["errors"]] == [3, 5, 6]
+        assert data["errors"][0]["username"] == "existing"
+
+        usernames = [u["username"] for u in client.get("/users/").json()]
+        assert usernames == ["existing", "csvone", "csvtwo"]
+
+    def test_ndjson_import_in_chunks(self, client, clean_db, monkeypatch):
+        """Test an NDJSON import spanning several insert chunks."""
+        monkeypatch.setattr(user_import, "IMPORT_CHUNK_SIZE", 2)
+        body = "\n".join(
+            f'{{"username": "bulk{i}", "email": "bulk{i}@gmail.com"}}' for i in range(5))
+
+        response = client.post(
+            "/users/import", content=body,
+            headers={"Content-Type": "application/x-ndjson"})
+        assert response.json()["inserted"] == 5
+
+        board = client.get("/leaderboard/", params={"limit": 100}).json()
+        assert len(board) == 5
+
+    def test_unsupported_content_type_returns_415(self, client):
+        """Test that only CSV and NDJSON bodies are accepted."""
+        response = client.post(
+            "/users/import", content="<users/>", headers={"Content-Type": "application/xml"})
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+    def test_duplicate_email_is_named_in_the_error(self, client, clean_db):
+        """Test the insert-first single user path."""
+        client.post("/users/", json={"username": "first", "email": "same@gmail.com"})
+
+        response = client.post(
+            "/users/", json={"username": "second", "email": "same@gmail.com"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Email already registered"
+
+        response = client.post(
+            "/users/", json={"username": "first", "email": "new@gmail.com"})
+        assert response.json()["detail"] == "Username already taken"
@@ -0,0 +1,50 @@
+import json
+from fastapi import status
+
+
+def create_users(client, count, prefix):
+    return [client.post("/users/", json={"username": f"{prefix}{i}",
+                                         "email": f"{prefix}{i}@gmail.com"}).json()
+            for i in range(count)]
+
+
+class TestUsersListing:
+
+    def test_keyset_pagination_follows_cursor(self, client, clean_db):
+        """Test walking all users page by page with the next cursor."""
+        users = create_users(client, 5, "paged")
+
+        response = client.get("/users/", params={"limit": 2})
+        assert response.status_code == status.HTTP_200_OK
+        seen = [u["id"] for u in response.json()]
+        while "X-Next-Cursor" in response.headers:
+            response = client.get(
+                "/users/", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+            seen += [u["id"] for u in response.json()]
+
+        assert seen == [u["id"] for u in users]
+
+    def test_ndjson_stream_returns_one_user_per_line(self, client, clean_db):
+        """Test the streaming listing."""
+        users = create_users(client, 3, "streamed")
+
+        response = client.get(
+            "/users/", params={"format": "ndjson", "cursor": users[0]["id"]})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [u["username"] for u in lines] == ["streamed1", "streamed2"]
+
+    def test_lookup_by_ids(self, client, clean_db):
+        """Test resolving several users in one request."""
+        users = create_users(client, 3, "lookup")
+
+        response = client.get(
+            "/users/", params={"ids": f"{users[2]['id']},{users[0]['id']},9999"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [u["id"] for u in response.json()] == [users[0]["id"], users[2]["id"]]
+
+    def test_lookup_by_invalid_ids_returns_400(self, client):
+        """Test that malformed ids are rejected."""
+        response = client.get("/users/", params={"ids": "1,two"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
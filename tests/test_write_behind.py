@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import status
+from sqlalchemy import func, select
+
+import main
+import write_behind
+from models import User, CheckIn
+from tests.conftest import TestingSession
+from write_behind import CheckInWriter, UserState, stop_check_in_writers
+
+
+@pytest.fixture
+def write_behind_mode(monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND", True)
+    yield
+    stop_check_in_writers()
+
+
+def _checkins(user_id):
+    with TestingSession() as db:
+        return db.scalar(select(func.count()).select_from(CheckIn)
+                         .where(CheckIn.user_id == user_id))
+
+
+class TestCheckInWriter:
+
+    def test_queued_check_ins_are_group_committed(self, client, clean_db, create_user):
+        """Test that one flush writes every queued check-in in one transaction."""
+        users = [create_user(client, f"group{i}") for i in range(3)]
+        writer = CheckInWriter(TestingSession, interval=60, max_batch=100)
+        flushes = write_behind.flush_size.count()
+        writer.start()
+        today = date.today()
+        for user in users:
+            assert writer.enqueue(user["id"], today, lambda: UserState(user["username"], 0, 0, None))
+        assert writer.depth() == 3
+
+        writer.stop()
+
+        assert writer.depth() == 0
+        assert write_behind.flush_size.count() == flushes + 1
+        assert [_checkins(user["id"]) for user in users] == [1, 1, 1]
+
+    def test_second_check_in_is_rejected_before_the_database(self):
+        """Test validation against the writer's own state."""
+        writer = CheckInWriter(TestingSession)
+        today = date.today()
+        yesterday = UserState("streaker", 4, 40, today - timedelta(days=1))
+
+        item = writer.enqueue(1, today, lambda: yesterday)
+        assert (item.current_streak, item.total_xp) == (5, 50)
+        assert writer.enqueue(1, today, lambda: pytest.fail("should not load")) is None
+
+
+class TestWriteBehindEndpoint:
+
+    def test_durable_check_in_is_committed_before_the_response(
+            self, client, clean_db, write_behind_mode, create_user):
+        """Test flush-before-ack."""
+        user = create_user(client, "durable")
+        response = client.post("/checkin/", json={"user_id": user["id"]})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_xp"] == 10
+        assert _checkins(user["id"]) == 1
+        again = client.post("/checkin/", json={"user_id": user["id"]})
+        assert again.status_code == status.HTTP_400_BAD_REQUEST
+        assert client.post("/checkin/", json={"user_id": 9999}).status_code == \
+            status.HTTP_404_NOT_FOUND
+
+    def test_fast_ack_is_written_on_shutdown(
+            self, client, clean_db, write_behind_mode, monkeypatch, create_user):
+        """Test that queued check-ins survive a graceful stop."""
+        monkeypatch.setattr(main, "WRITE_BEHIND_INTERVAL_MS", 60_000)
+        monkeypatch.setattr(main, "WRITE_BEHIND_DURABLE", False)
+        user = create_user(client, "fastack")
+
+        assert client.post("/checkin/", json={"user_id": user["id"]}).status_code == \
+            status.HTTP_200_OK
+        assert _checkins(user["id"]) == 0
+        assert "write_behind_queue_depth 1" in client.get("/metrics").text
+
+        stop_check_in_writers()
+        assert _checkins(user["id"]) == 1
+        with TestingSession() as db:
+            assert db.get(User, user["id"]).total_xp == 10
+
+    def test_conflicting_write_fails_only_that_check_in(
+            self, client, clean_db, write_behind_mode, create_user):
+        """Test that a row rejected by the database is reported, not the whole batch."""
+        user = create_user(client, "conflict")
+        # Written behind the API's back, so the cached state still allows a check-in
+        with TestingSession() as db:
+            db.add(CheckIn(user_id=user["id"], xp_earned=10, checkin_date=date.today()))
+            db.commit()
+        failures = write_behind.failed_check_ins.value()
+
+        response = client.post("/checkin/", json={"user_id": user["id"]})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert write_behind.failed_check_ins.value() == failures + 1
+        with TestingSession() as db:
+            assert db.get(User, user["id"]).total_xp == 0
+
+    def test_failed_fast_ack_is_taken_back(
+            self, client, clean_db, write_behind_mode, monkeypatch, create_user):
+        """Test an acknowledged check-in that fails to write leaves no XP in reads."""
+        monkeypatch.setattr(main, "WRITE_BEHIND_DURABLE", False)
+        user = create_user(client, "takenback")
+        client.get("/leaderboard/")
+        with TestingSession() as db:
+            db.add(CheckIn(user_id=user["id"], xp_earned=10, checkin_date=date.today()))
+            db.commit()
+
+        response = client.post("/checkin/", json={"user_id": user["id"]})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_xp"] == 10
+        stop_check_in_writers()
+
+        assert client.get(f"/users/{user['id']}").json()["total_xp"] == 0
+        board = client.get("/leaderboard/").json()
+        assert [entry["total_xp"] for entry in board if entry["user_id"] == user["id"]] == [0]
@@ -0,0 +1,165 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from leaderboard import get_leaderboard_index
+from models import User
+from schemas import UserCreate, UserImportError, UserImportResponse
+
+IMPORT_CHUNK_SIZE = 500
+DUPLICATE_USER = "Username or email already exists"
+
+# (line number, validated row) pairs handed to the database in chunks
+ImportRow = Tuple[int, UserCreate]
+
+
+def duplicate_user_detail(error: IntegrityError) -> str:
+    """Name the unique constraint a failed user insert ran into."""
+    message = str(error.orig).lower()
+    if "email" in message:
+        return "Email already registered"
+    if "username" in message:
+        return "Username already taken"
+    return DUPLICATE_USER
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed UTF-8 body into lines without buffering all of it."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _parse_line(line: str, kind: str, header: Optional[List[str]]) -> dict:
+    if kind == "csv":
+        values = next(csv.reader([line]))
+        if len(values) != len(header):
+            raise ValueError(
+                f"Expected {len(header)} columns, got {len(values)}")
+        return dict(zip(header, values))
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    return record
+
+
+def insert_user_chunk(db: Session, rows: List[ImportRow]) -> List[UserImportError]:
+    """
+    Insert a chunk of users with one multi-row statement.
+
+    Duplicates are left to the unique indexes on username and email instead
+    of being looked up first.
+
+    Args:
+        db (Session): The database session.
+        rows (list): (line number, UserCreate) pairs.
+
+    Returns:
+        list: A UserImportError for every row that was not inserted.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = (
+            upsert(User)
+            .values([{"username": user.username, "email": user.email,
+                      "total_xp": 0, "current_streak": 0} for _, user in rows])
+            .on_conflict_do_nothing()
+            .returning(User.id, User.username, User.email))
+        inserted = {(row.username, row.email): row.id for row in db.execute(statement)}
+        db.commit()
+    else:
+        # No ON CONFLICT: insert row by row, each under its own savepoint
+        inserted = {}
+        for _, user in rows:
+            try:
+                with db.begin_nested():
+                    user_id = db.execute(insert(User).values(
+                        username=user.username, email=user.email,
+                        total_xp=0, current_streak=0)).inserted_primary_key[0]
+                inserted[(user.username, user.email)] = user_id
+            except IntegrityError:
+                pass
+        db.commit()
+
+    index = get_leaderboard_index(db, load=False)
+    errors = []
+    claimed = set()
+    for line, user in rows:
+        key = (user.username, user.email)
+        # An identical row earlier in the chunk owns the inserted id
+        if key not in inserted or key in claimed:
+            errors.append(UserImportError(
+                line=line, username=user.username, error=DUPLICATE_USER))
+            continue
+        claimed.add(key)
+        index.upsert(inserted[key], user.username, 0, 0)
+    return errors
+
+
+async def import_users(lines: AsyncIterator[str], kind: str,
+                       insert_chunk: Callable[[List[ImportRow]], Awaitable[List[UserImportError]]]
+                       ) -> UserImportResponse:
+    """
+    Validate streamed CSV or NDJSON rows and insert them in chunks.
+
+    Args:
+        lines: Lines of the request body.
+        kind (str): "csv" (with a header row) or "ndjson".
+        insert_chunk: Coroutine inserting a chunk of rows, see insert_user_chunk.
+
+    Returns:
+        UserImportResponse: Counts and the rows that were rejected.
+    """
+    header = None
+    chunk: List[ImportRow] = []
+    errors: List[UserImportError] = []
+    received = 0
+    number = 0
+
+    async for text in lines:
+        number += 1
+        if not text.strip():
+            continue
+        if kind == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([text]))]
+            continue
+
+        received += 1
+        try:
+            chunk.append((number, UserCreate(**_parse_line(text, kind, header))))
+        except (ValueError, ValidationError) as e:
+            detail = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+            errors.append(UserImportError(line=number, error=detail))
+            continue
+
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            errors += await insert_chunk(chunk)
+            chunk = []
+
+    if chunk:
+        errors += await insert_chunk(chunk)
+
+    return UserImportResponse(
+        received=received,
+        inserted=received - len(errors),
+        failed=len(errors),
+        errors=sorted(errors, key=lambda error: error.line)
+    )
+
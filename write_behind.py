@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+from database_utils import create_db_engine, database_key
+from metrics import registry
+from models import User, CheckIn
+from rollups import add_xp
+from streaks import calculate_milestone_bonus
+
+logger = logging.getLogger("daily_streak.write_behind")
+
+FLUSH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+flush_seconds = registry.histogram(
+    "write_behind_flush_seconds", "Time to group-commit one batch of check-ins")
+flush_size = registry.histogram(
+    "write_behind_flush_size", "Check-ins per group commit", FLUSH_SIZE_BUCKETS)
+failed_check_ins = registry.counter(
+    "write_behind_failed_total", "Queued check-ins that could not be written")
+
+
+class UserState(NamedTuple):
+    """What check-in validation needs to know about a user."""
+    username: str
+    current_streak: int
+    total_xp: int
+    last_check_in_date: Optional[date]
+
+
+@dataclass
+class QueuedCheckIn:
+    """An accepted check-in waiting for the flusher; `written` resolves once it is committed."""
+    user_id: int
+    username: str
+    checkin_date: date
+    xp_earned: int
+    milestone_bonus: int
+    current_streak: int
+    total_xp: int
+    is_comeback: bool
+    written: Future = field(default_factory=Future)
+
+
+# Core statement run with one parameter set per queued check-in. XP is added
+# rather than assigned so writes from outside the queue (e.g. batch
+# check-ins) are not overwritten.
+_users = User.__table__
+_apply_check_in = (
+    update(_users)
+    .where(_users.c.id == bindparam("uid"))
+    .values(current_streak=bindparam("streak"),
+            total_xp=_users.c.total_xp + bindparam("xp"),
+            last_check_in_date=bindparam("day"))
+)
+
+
+class CheckInWriter:
+    """
+    Write-behind queue that group-commits check-ins.
+
+    Check-ins are validated against the user's latest known state, queued, and
+    written by a background thread every `interval` seconds or `max_batch`
+    items, in one transaction per batch. Users with a queued or same-day
+    check-in are tracked here, so a second check-in is rejected before it
+    reaches the database.
+
+    `on_written` is called after a batch commits, and `on_failed` with a
+    session and the check-ins that could not be written, so callers that
+    published them before the flush can take them back.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], interval: float = 0.05,
+                 max_batch: int = 500, on_written: Optional[Callable[[], None]] = None,
+                 on_failed: Optional[Callable[[Session, List["QueuedCheckIn"]], None]] = None):
+        self._session_factory = session_factory
+        self._on_written = on_written
+        self._on_failed = on_failed
+        self.interval = interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue: List[QueuedCheckIn] = []
+        self._in_flight: List[QueuedCheckIn] = []
+        # Latest state of users checked in today or still waiting to be written
+        self._state: Dict[int, UserState] = {}
+        self._unwritten: Dict[int, int] = {}
+        self._state_day: Optional[date] = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="check-in-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write everything still queued and stop the flusher."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join(timeout)
+
+    def depth(self) -> int:
+        """Check-ins accepted but not yet committed."""
+        with self._lock:
+            return len(self._queue) + len(self._in_flight)
+
+    def enqueue(self, user_id: int, today: date,
+                load: Callable[[], Optional[UserState]]) -> Optional[QueuedCheckIn]:
+        """
+        Accept a check-in for `user_id` and queue it for writing.
+
+        Args:
+            user_id (int): The user checking in.
+            today (date): The check-in date.
+            load (callable): Returns the user's current state, or None if the
+                user does not exist. Only called, outside the lock, for users
+                this writer is not tracking.
+
+        Returns:
+            QueuedCheckIn: The queued check-in, or None if the user already
+                checked in today.
+
+        Raises:
+            LookupError: If the user does not exist.
+        """
+        with self._lock:
+            state = self._state.get(user_id)
+        if state is None:
+            state = load()
+            if state is None:
+                raise LookupError(user_id)
+
+        with self._lock:
+            # Another request may have queued this user while we were loading
+            state = self._state.get(user_id, state)
+            if state.last_check_in_date == today:
+                return None
+
+            if state.last_check_in_date == today - timedelta(days=1):
+                streak = state.current_streak + 1
+            else:
+                streak = 1
+            milestone_bonus = calculate_milestone_bonus(streak=streak)
+            xp_earned = 10 + milestone_bonus
+            item = QueuedCheckIn(
+                user_id=user_id,
+                username=state.username,
+                checkin_date=today,
+                xp_earned=xp_earned,
+                milestone_bonus=milestone_bonus,
+                current_streak=streak,
+                total_xp=state.total_xp + xp_earned,
+                is_comeback=streak == 1 and state.total_xp > 0,
+            )
+            self._state[user_id] = UserState(
+                state.username, item.current_streak, item.total_xp, today)
+            self._unwritten[user_id] = self._unwritten.get(user_id, 0) + 1
+            self._queue.append(item)
+            if len(self._queue) in (1, self.max_batch):
+                self._wakeup.notify()
+        return item
+
+    def track(self, user_id: int, state: UserState) -> None:
+        """Record a check-in that was written without going through the queue."""
+        with self._lock:
+            if user_id not in self._unwritten:
+                self._state[user_id] = state
+
+    def wait(self, item: QueuedCheckIn) -> None:
+        """Block until `item` is committed, re-raising the error if writing it failed."""
+        if in_greenlet():
+            # Under AsyncSession.run_sync: yield to the event loop while waiting
+            await_only(asyncio.wrap_future(item.written))
+        else:
+            item.written.result()
+
+    def flush(self) -> None:
+        """Write everything queued so far before returning."""
+        with self._lock:
+            pending = self._in_flight + self._queue
+            self._wakeup.notify()
+        for item in pending:
+            try:
+                self.wait(item)
+            except Exception:
+                # Already counted and logged by the flusher
+                pass
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopping:
+                    self._wakeup.wait()
+                if len(self._queue) < self.max_batch and not self._stopping:
+                    # Let the batch fill up until the interval has passed
+                    self._wakeup.wait(self.interval)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                self._in_flight = batch
+                stopping = self._stopping and not self._queue
+            if batch:
+                self._write(batch)
+            with self._lock:
+                self._in_flight = []
+            if stopping:
+                return
+
+    def _write(self, batch: List[QueuedCheckIn]) -> None:
+        started = time.perf_counter()
+        failed: Dict[int, BaseException] = {}
+        db = self._session_factory()
+        try:
+            try:
+                db.execute(_apply_check_in, [_update_params(item) for item in batch])
+                db.execute(insert(CheckIn.__table__), [_insert_params(item) for item in batch])
+                add_xp(db, [_rollup_params(item) for item in batch])
+                db.commit()
+            except Exception:
+                # One bad row fails the group; retry one at a time to find it
+                db.rollback()
+                for position, item in enumerate(batch):
+                    try:
+                        db.execute(_apply_check_in, [_update_params(item)])
+                        db.execute(insert(CheckIn.__table__), [_insert_params(item)])
+                        add_xp(db, [_rollup_params(item)])
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        failed[position] = e
+        except Exception as e:
+            failed = {position: e for position in range(len(batch))}
+        finally:
+            db.close()
+
+        flush_seconds.observe(time.perf_counter() - started)
+        flush_size.observe(len(batch))
+        if self._on_written is not None and len(failed) < len(batch):
+            self._on_written()
+        self._settle(batch, failed)
+        if self._on_failed is not None and failed:
+            try:
+                with self._session_factory() as db:
+                    self._on_failed(db, [batch[position] for position in failed])
+            except Exception:
+                logger.exception("could not undo %d failed check-ins", len(failed))
+
+    def _settle(self, batch: List[QueuedCheckIn], failed: Dict[int, BaseException]) -> None:
+        with self._lock:
+            for position, item in enumerate(batch):
+                self._unwritten[item.user_id] -= 1
+                if not self._unwritten[item.user_id]:
+                    del self._unwritten[item.user_id]
+                if position in failed:
+                    # Forget what we assumed; the next check-in reloads the user
+                    self._state.pop(item.user_id, None)
+            self._forget_old_state(date.today())
+
+        for position, item in enumerate(batch):
+            error = failed.get(position)
+            if error is None:
+                item.written.set_result(None)
+            else:
+                failed_check_ins.inc()
+                logger.error("check-in for user %s could not be written: %s",
+                             item.user_id, error)
+                item.written.set_exception(error)
+
+    def _forget_old_state(self, today: date) -> None:
+        """Once the day changes, drop written users that have not checked in today."""
+        if self._state_day == today:
+            return
+        self._state_day = today
+        self._state = {user_id: state for user_id, state in self._state.items()
+                       if state.last_check_in_date == today or user_id in self._unwritten}
+
+
+def _update_params(item: QueuedCheckIn) -> dict:
+    return {"uid": item.user_id, "streak": item.current_streak,
+            "xp": item.xp_earned, "day": item.checkin_date}
+
+
+def _insert_params(item: QueuedCheckIn) -> dict:
+    return {"user_id": item.user_id, "xp_earned": item.xp_earned,
+            "checkin_date": item.checkin_date}
+
+
+def _rollup_params(item: QueuedCheckIn) -> tuple:
+    return item.user_id, item.checkin_date, item.xp_earned
+
+
+_writers: Dict[str, CheckInWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_check_in_writer(db: Session, interval: float, max_batch: int,
+                        on_written: Optional[Callable[[], None]] = None,
+                        on_failed: Optional[Callable[[Session, List[QueuedCheckIn]], None]] = None,
+                        ) -> CheckInWriter:
+    """Return the running writer for the database `db` is bound to."""
+    key = database_key(db)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            bind = db.get_bind()
+            if bind.dialect.is_async:
+                # The flusher is a plain thread, so give it a sync engine
+                url = bind.url.set(drivername=bind.url.get_backend_name())
+                bind = create_db_engine(url.render_as_string(hide_password=False))
+            writer = CheckInWriter(sessionmaker(autoflush=False, bind=bind),
+                                   interval=interval, max_batch=max_batch,
+                                   on_written=on_written, on_failed=on_failed)
+            writer.start()
+            _writers[key] = writer
+    return writer
+
+
+def stop_check_in_writers(timeout: Optional[float] = None) -> None:
+    """Flush and stop every writer, e.g. on shutdown."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop(timeout)
+
+
+registry.gauge("write_behind_queue_depth", "Check-ins accepted but not yet committed",
+               lambda: sum(writer.depth() for writer in list(_writers.values())))